@@ -5,10 +5,26 @@ This agent demonstrates how to use OpenAPIToolset to interact with the
 OpenWeatherMap API for weather information retrieval.
 """
 
+from google.adk import __version__ as adk_version
 from google.adk.agents import Agent
 from google.adk.tools.openapi_tool import OpenAPIToolset
 from google.adk.tools.openapi_tool.auth.auth_helpers import token_to_scheme_credential
+import functools
+import hashlib
+import importlib.util
 import os
+import pickle
+import sys
+import textwrap
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 # ============================================================================
 # OPENAPI SPECIFICATION
@@ -16,241 +32,12 @@ import os
 
 # OpenWeatherMap API OpenAPI Specification
 # Based on: https://openweathermap.org/api
-WEATHER_API_SPEC = {
-    "openapi": "3.0.0",
-    "info": {
-        "title": "OpenWeatherMap API",
-        "description": "Weather data API for current weather and forecasts",
-        "version": "2.5.0"
-    },
-    "servers": [
-        {
-            "url": "https://api.openweathermap.org/data/2.5"
-        }
-    ],
-    "paths": {
-        "/weather": {
-            "get": {
-                "operationId": "get_current_weather",
-                "summary": "Get current weather",
-                "description": "Returns current weather data for a specified location.",
-                "parameters": [
-                    {
-                        "name": "q",
-                        "in": "query",
-                        "description": "City name, state code (US only), and country code divided by comma (e.g., 'London,UK' or 'Paris,FR')",
-                        "required": False,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "lat",
-                        "in": "query",
-                        "description": "Latitude",
-                        "required": False,
-                        "schema": {
-                            "type": "number"
-                        }
-                    },
-                    {
-                        "name": "lon",
-                        "in": "query",
-                        "description": "Longitude",
-                        "required": False,
-                        "schema": {
-                            "type": "number"
-                        }
-                    },
-                    {
-                        "name": "units",
-                        "in": "query",
-                        "description": "Units of measurement (standard, metric, imperial)",
-                        "required": False,
-                        "schema": {
-                            "type": "string",
-                            "enum": ["standard", "metric", "imperial"],
-                            "default": "metric"
-                        }
-                    },
-                    {
-                        "name": "appid",
-                        "in": "query",
-                        "description": "API key",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "coord": {
-                                            "type": "object",
-                                            "properties": {
-                                                "lon": {"type": "number"},
-                                                "lat": {"type": "number"}
-                                            }
-                                        },
-                                        "weather": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "integer"},
-                                                    "main": {"type": "string"},
-                                                    "description": {"type": "string"},
-                                                    "icon": {"type": "string"}
-                                                }
-                                            }
-                                        },
-                                        "main": {
-                                            "type": "object",
-                                            "properties": {
-                                                "temp": {"type": "number"},
-                                                "feels_like": {"type": "number"},
-                                                "temp_min": {"type": "number"},
-                                                "temp_max": {"type": "number"},
-                                                "pressure": {"type": "integer"},
-                                                "humidity": {"type": "integer"}
-                                            }
-                                        },
-                                        "wind": {
-                                            "type": "object",
-                                            "properties": {
-                                                "speed": {"type": "number"},
-                                                "deg": {"type": "integer"}
-                                            }
-                                        },
-                                        "clouds": {
-                                            "type": "object",
-                                            "properties": {
-                                                "all": {"type": "integer"}
-                                            }
-                                        },
-                                        "name": {"type": "string"},
-                                        "sys": {
-                                            "type": "object",
-                                            "properties": {
-                                                "country": {"type": "string"}
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/forecast": {
-            "get": {
-                "operationId": "get_weather_forecast",
-                "summary": "Get 5 day weather forecast",
-                "description": "Returns 5 day weather forecast with data every 3 hours.",
-                "parameters": [
-                    {
-                        "name": "q",
-                        "in": "query",
-                        "description": "City name, state code, and country code",
-                        "required": False,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "lat",
-                        "in": "query",
-                        "description": "Latitude",
-                        "required": False,
-                        "schema": {
-                            "type": "number"
-                        }
-                    },
-                    {
-                        "name": "lon",
-                        "in": "query",
-                        "description": "Longitude",
-                        "required": False,
-                        "schema": {
-                            "type": "number"
-                        }
-                    },
-                    {
-                        "name": "units",
-                        "in": "query",
-                        "description": "Units of measurement",
-                        "required": False,
-                        "schema": {
-                            "type": "string",
-                            "enum": ["standard", "metric", "imperial"],
-                            "default": "metric"
-                        }
-                    },
-                    {
-                        "name": "cnt",
-                        "in": "query",
-                        "description": "Number of timestamps to return (max 40)",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 40
-                        }
-                    },
-                    {
-                        "name": "appid",
-                        "in": "query",
-                        "description": "API key",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "list": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "dt": {"type": "integer"},
-                                                    "main": {"type": "object"},
-                                                    "weather": {"type": "array"},
-                                                    "wind": {"type": "object"},
-                                                    "dt_txt": {"type": "string"}
-                                                }
-                                            }
-                                        },
-                                        "city": {
-                                            "type": "object",
-                                            "properties": {
-                                                "name": {"type": "string"},
-                                                "country": {"type": "string"}
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    }
-}
+# The spec lives in weather_api_spec.json next to this module and is parsed
+# once at import. orjson's C parser is used when it is installed; the stdlib
+# json module produces the same dict otherwise.
+WEATHER_API_SPEC_PATH = Path(__file__).with_name("weather_api_spec.json")
+WEATHER_API_SPEC_BYTES = WEATHER_API_SPEC_PATH.read_bytes()
+WEATHER_API_SPEC = _json.loads(WEATHER_API_SPEC_BYTES)
 
 # ============================================================================
 # OPENAPI TOOLSET WITH AUTHENTICATION
@@ -265,28 +52,119 @@ if not weather_api_key:
     print("Get your free API key at: https://openweathermap.org/api")
     weather_api_key = "demo_key"  # Placeholder
 
-# Create OpenAPIToolset - OpenWeatherMap uses API key in query params
-# No special auth header needed, the API key is passed as a query parameter
-weather_toolset = OpenAPIToolset(
-    spec_dict=WEATHER_API_SPEC,
-    # OpenWeatherMap doesn't use header auth, API key is in query params
-    # So we don't need auth_scheme/auth_credential here
+# One connection pool shared by every weather tool call, so TLS handshakes are
+# paid once rather than per request. RestApiTool closes the client returned by
+# httpx_client_factory after each call, so the client wraps the shared pool in
+# a transport whose close is a no-op.
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Delegate to a long-lived transport without closing it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+weather_http_transport = httpx.AsyncHTTPTransport(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+)
+
+
+def weather_http_client() -> httpx.AsyncClient:
+    """Client factory for the weather tools, backed by the shared pool."""
+    return httpx.AsyncClient(
+        transport=_SharedTransport(weather_http_transport),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+async def warm_up_weather_connections() -> None:
+    """Open a pooled connection to the OpenWeatherMap server ahead of traffic."""
+    async with weather_http_client() as client:
+        await client.head(WEATHER_API_SPEC["servers"][0]["url"] + "/weather")
+
+
+# Parsing the spec into tools runs on every process start, including every
+# uvicorn --reload worker. The built toolset is pickled into this directory,
+# keyed by a hash of the spec bytes, the ADK version, this module's name and
+# the client factory the tools refer to (pickled by its qualified name), so
+# later starts load it instead of parsing again. A changed spec, module or
+# factory simply produces a new key.
+TOOLSET_CACHE_DIR = Path(
+    os.getenv("ADK_TOOLSET_CACHE_DIR", Path.home() / ".cache" / "adk")
 )
 
+
+def private_cache_dir() -> Optional[Path]:
+    """Return TOOLSET_CACHE_DIR, created 0700, if only this user can write it.
+
+    Anyone who can plant a file in the directory gets code run in this process
+    when the file is unpickled, so a directory owned by another user, or
+    writable by group or others, is not used and nothing is cached.
+    """
+    try:
+        TOOLSET_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = TOOLSET_CACHE_DIR.stat()
+    except OSError:
+        return None  # Caching is best-effort; a read-only home still works
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+        print(f"Warning: not using {TOOLSET_CACHE_DIR}, others can write to it")
+        return None
+    return TOOLSET_CACHE_DIR
+
+
+@functools.lru_cache(maxsize=None)
+def load_weather_toolset(spec_bytes: bytes) -> OpenAPIToolset:
+    """Return the toolset for a spec, from the on-disk cache when possible."""
+    factory = f"{weather_http_client.__module__}.{weather_http_client.__qualname__}"
+    key = hashlib.blake2b(
+        spec_bytes + adk_version.encode() + __name__.encode() + factory.encode(),
+        digest_size=16
+    ).hexdigest()
+    cache_dir = private_cache_dir()
+    cache_file = cache_dir / f"toolset-{key}.pkl" if cache_dir else None
+
+    if cache_file is not None:
+        try:
+            return pickle.loads(cache_file.read_bytes())
+        except Exception:
+            pass  # Missing or unreadable cache entry: build it below
+
+    # Create OpenAPIToolset - OpenWeatherMap uses API key in query params
+    # No special auth header needed, the API key is passed as a query parameter
+    toolset = OpenAPIToolset(
+        spec_dict=_json.loads(spec_bytes),
+        httpx_client_factory=weather_http_client,
+        # OpenWeatherMap doesn't use header auth, API key is in query params
+        # So we don't need auth_scheme/auth_credential here
+    )
+
+    if cache_file is not None:
+        try:
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_bytes(pickle.dumps(toolset))
+            tmp_file.replace(cache_file)
+        except OSError:
+            pass  # Caching is best-effort; a read-only home still works
+
+    return toolset
+
+
+weather_toolset = load_weather_toolset(WEATHER_API_SPEC_BYTES)
+
 # ============================================================================
 # AGENT DEFINITION
 # ============================================================================
 
-weather_agent = Agent(
-    name="weather_assistant",
-    model="gemini-2.0-flash",
-
-    description="""
-    Weather assistant that provides current weather information and forecasts
-    for any location worldwide using the OpenWeatherMap API.
-    """,
-
-    instruction=f"""
+# The instruction is dedented and formatted once at import. The API key is the
+# only per-deployment value and sits on the last line, so everything before it
+# is a byte-identical prefix that provider-side prompt caching can reuse.
+WEATHER_INSTRUCTION_TEMPLATE = textwrap.dedent("""\
     You are a helpful weather assistant! You can provide current weather information
     and 5-day forecasts for any location in the world.
 
@@ -297,7 +175,7 @@ weather_agent = Agent(
     - Provide detailed weather information including temperature, humidity, wind, etc.
 
     IMPORTANT NOTES:
-    - ALWAYS include the API key parameter: appid="{weather_api_key}"
+    - ALWAYS include the API key parameter appid (its value is given at the end)
     - Default to metric units (Celsius) unless user specifies otherwise
     - For city names, use format: "CityName,CountryCode" (e.g., "London,UK", "Paris,FR")
     - Be conversational and friendly in your responses
@@ -314,12 +192,12 @@ weather_agent = Agent(
     EXAMPLE INTERACTIONS:
     User: "What's the weather in Paris?"
     You: "Let me check the current weather in Paris for you! 🌍"
-    [Call get_current_weather with q="Paris,FR", units="metric", appid="{weather_api_key}"]
+    [Call get_current_weather with q="Paris,FR", units="metric", appid=<API key>]
     Then provide a friendly summary of the results.
 
     User: "Will it rain in London tomorrow?"
     You: "I'll check the forecast for London! 🌧️"
-    [Call get_weather_forecast with q="London,UK", units="metric", appid="{weather_api_key}"]
+    [Call get_weather_forecast with q="London,UK", units="metric", appid=<API key>]
     Then analyze the forecast data and answer about rain probability.
 
     HANDLING ERRORS:
@@ -328,8 +206,23 @@ weather_agent = Agent(
     - Always be helpful and suggest alternatives
 
     Remember: You're here to help people plan their day and activities based on weather!
+
+    API KEY: use appid="{api_key}" for every weather tool call.
+""")
+
+WEATHER_INSTRUCTION = sys.intern(WEATHER_INSTRUCTION_TEMPLATE.format(api_key=weather_api_key))
+
+weather_agent = Agent(
+    name="weather_assistant",
+    model="gemini-2.0-flash",
+
+    description="""
+    Weather assistant that provides current weather information and forecasts
+    for any location worldwide using the OpenWeatherMap API.
     """,
 
+    instruction=WEATHER_INSTRUCTION,
+
     tools=[weather_toolset]
 )
 
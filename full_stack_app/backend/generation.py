@@ -0,0 +1,92 @@
+"""
+Per-request generation settings and agent runs shared by the backend APIs.
+
+Agents are shared by every request, so writing a request's temperature and
+max tokens to agent.generate_content_config lets concurrent requests
+overwrite each other. Handlers instead set the config for their own
+invocation with use_generation_config(), and a before-model callback copies
+it onto ADK's per-call request config.
+
+Both apps also build the user turn and read text out of a runner's events
+the same way, so user_message() and agent_text() live here too.
+"""
+
+import functools
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.adk.runners import Runner
+from google.genai import types
+
+_current_config: ContextVar[Optional[types.GenerateContentConfig]] = ContextVar(
+    "generation_config", default=None
+)
+
+
+@functools.lru_cache(maxsize=256)
+def generation_config(temperature: float, max_tokens: int) -> types.GenerateContentConfig:
+    """
+    Generation config for a (temperature, max_tokens) pair, built once.
+
+    Clients send the same few settings over and over, so configs are shared
+    instead of revalidated per request. They are only read, never mutated.
+    """
+    return types.GenerateContentConfig(
+        temperature=temperature,
+        max_output_tokens=max_tokens
+    )
+
+
+def use_generation_config(temperature: float, max_tokens: int):
+    """Set the generation settings for the invocation run in this context."""
+    _current_config.set(generation_config(temperature, max_tokens))
+
+
+def apply_generation_config(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> None:
+    """Before-model callback applying the current invocation's settings."""
+    config = _current_config.get()
+    if config is not None:
+        llm_request.config.temperature = config.temperature
+        llm_request.config.max_output_tokens = config.max_output_tokens
+    return None
+
+
+def install_generation_callback(agent: Any):
+    """Add apply_generation_config to an agent's before-model callbacks once."""
+    callbacks = agent.before_model_callback
+    if callbacks is None:
+        agent.before_model_callback = apply_generation_config
+    elif isinstance(callbacks, list):
+        if apply_generation_config not in callbacks:
+            callbacks.append(apply_generation_config)
+    elif callbacks is not apply_generation_config:
+        agent.before_model_callback = [callbacks, apply_generation_config]
+
+
+def user_message(query: str) -> types.Content:
+    """Build the user turn sent to a runner."""
+    # The query is already validated by the request model, so skip
+    # re-validating the fixed role/parts shape
+    return types.Content.model_construct(
+        role="user",
+        parts=[types.Part.model_construct(text=query)]
+    )
+
+
+async def agent_text(
+    runner: Runner, session_id: str, new_message: types.Content, user_id: str = "api_user"
+) -> AsyncIterator[str]:
+    """Run an agent and yield the text of each event that carries some."""
+    async for event in runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=new_message
+    ):
+        if event.content and event.content.parts:
+            text = event.content.parts[0].text
+            if text:
+                yield text
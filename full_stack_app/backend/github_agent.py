@@ -5,10 +5,28 @@ This agent demonstrates how to use OpenAPIToolset to interact with the
 GitHub API for code review tasks without writing custom tool functions.
 """
 
+from google.adk import __version__ as adk_version
 from google.adk.agents import Agent
-from google.adk.tools.openapi_tool import OpenAPIToolset
-from google.adk.tools.openapi_tool.auth.auth_helpers import token_to_scheme_credential
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.openapi_tool.openapi_spec_parser import OpenApiSpecParser, RestApiTool
+from google.adk.tools.tool_context import ToolContext
+import asyncio
+import functools
+import hashlib
+import importlib.util
 import os
+import pickle
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 # ============================================================================
 # OPENAPI SPECIFICATION
@@ -16,569 +34,319 @@ import os
 
 # GitHub API OpenAPI Specification (subset for PR review)
 # Based on: https://docs.github.com/en/rest
-GITHUB_API_SPEC = {
-    "openapi": "3.0.0",
-    "info": {
-        "title": "GitHub API",
-        "description": "GitHub REST API for pull request review operations",
-        "version": "2022-11-28"
-    },
-    "servers": [
-        {
-            "url": "https://api.github.com"
-        }
-    ],
-    "components": {
-        "securitySchemes": {
-            "bearerAuth": {
-                "type": "http",
-                "scheme": "bearer",
-                "description": "GitHub Personal Access Token"
-            }
-        }
-    },
-    "security": [
-        {
-            "bearerAuth": []
-        }
-    ],
-    "paths": {
-        "/repos/{owner}/{repo}/pulls/{pull_number}": {
-            "get": {
-                "operationId": "get_pull_request",
-                "summary": "Get a pull request",
-                "description": "Get detailed information about a specific pull request including title, description, state, files changed, and metadata.",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner (username or organization)",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "pull_number",
-                        "in": "path",
-                        "description": "Pull request number",
-                        "required": True,
-                        "schema": {
-                            "type": "integer"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "number": {"type": "integer"},
-                                        "title": {"type": "string"},
-                                        "body": {"type": "string"},
-                                        "state": {"type": "string"},
-                                        "user": {
-                                            "type": "object",
-                                            "properties": {
-                                                "login": {"type": "string"}
-                                            }
-                                        },
-                                        "head": {
-                                            "type": "object",
-                                            "properties": {
-                                                "ref": {"type": "string"},
-                                                "sha": {"type": "string"}
-                                            }
-                                        },
-                                        "base": {
-                                            "type": "object",
-                                            "properties": {
-                                                "ref": {"type": "string"}
-                                            }
-                                        },
-                                        "changed_files": {"type": "integer"},
-                                        "additions": {"type": "integer"},
-                                        "deletions": {"type": "integer"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/repos/{owner}/{repo}/pulls/{pull_number}/comments": {
-            "get": {
-                "operationId": "list_review_comments",
-                "summary": "List review comments on a pull request",
-                "description": "Get all review comments (line-specific comments) for a pull request.",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "pull_number",
-                        "in": "path",
-                        "description": "Pull request number",
-                        "required": True,
-                        "schema": {
-                            "type": "integer"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "id": {"type": "integer"},
-                                            "body": {"type": "string"},
-                                            "path": {"type": "string"},
-                                            "line": {"type": "integer"},
-                                            "user": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "login": {"type": "string"}
-                                                }
-                                            },
-                                            "created_at": {"type": "string"}
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            "post": {
-                "operationId": "create_review_comment",
-                "summary": "Create a review comment on a pull request",
-                "description": "Add a new review comment to a specific line in a pull request.",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "pull_number",
-                        "in": "path",
-                        "description": "Pull request number",
-                        "required": True,
-                        "schema": {
-                            "type": "integer"
-                        }
-                    }
-                ],
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "required": ["body", "commit_id", "path", "line"],
-                                "properties": {
-                                    "body": {
-                                        "type": "string",
-                                        "description": "The comment text"
-                                    },
-                                    "commit_id": {
-                                        "type": "string",
-                                        "description": "The SHA of the commit to comment on"
-                                    },
-                                    "path": {
-                                        "type": "string",
-                                        "description": "The relative path to the file"
-                                    },
-                                    "line": {
-                                        "type": "integer",
-                                        "description": "The line number in the diff to comment on"
-                                    }
-                                }
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "201": {
-                        "description": "Comment created successfully",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "integer"},
-                                        "body": {"type": "string"},
-                                        "path": {"type": "string"},
-                                        "line": {"type": "integer"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/repos/{owner}/{repo}/pulls/{pull_number}/files": {
-            "get": {
-                "operationId": "list_pull_request_files",
-                "summary": "List files in a pull request",
-                "description": "Get the list of files changed in a pull request with their diffs.",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "pull_number",
-                        "in": "path",
-                        "description": "Pull request number",
-                        "required": True,
-                        "schema": {
-                            "type": "integer"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "filename": {"type": "string"},
-                                            "status": {"type": "string"},
-                                            "additions": {"type": "integer"},
-                                            "deletions": {"type": "integer"},
-                                            "changes": {"type": "integer"},
-                                            "patch": {"type": "string"}
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/repos/{owner}/{repo}/issues/{issue_number}/comments": {
-            "post": {
-                "operationId": "create_issue_comment",
-                "summary": "Create a general comment on a pull request",
-                "description": "Add a general comment to a pull request (not tied to a specific line).",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "issue_number",
-                        "in": "path",
-                        "description": "Pull request number (PRs are issues in GitHub API)",
-                        "required": True,
-                        "schema": {
-                            "type": "integer"
-                        }
-                    }
-                ],
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "required": ["body"],
-                                "properties": {
-                                    "body": {
-                                        "type": "string",
-                                        "description": "The comment text"
-                                    }
-                                }
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "201": {
-                        "description": "Comment created successfully",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "integer"},
-                                        "body": {"type": "string"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/user/repos": {
-            "get": {
-                "operationId": "list_user_repositories",
-                "summary": "List repositories for the authenticated user",
-                "description": "Get a list of repositories owned by the authenticated user.",
-                "parameters": [
-                    {
-                        "name": "per_page",
-                        "in": "query",
-                        "description": "Number of results per page (max 100)",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 30
-                        }
-                    },
-                    {
-                        "name": "page",
-                        "in": "query",
-                        "description": "Page number of results",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 1
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "id": {"type": "integer"},
-                                            "name": {"type": "string"},
-                                            "full_name": {"type": "string"},
-                                            "private": {"type": "boolean"},
-                                            "owner": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "login": {"type": "string"}
-                                                }
-                                            },
-                                            "description": {"type": "string"},
-                                            "language": {"type": "string"},
-                                            "updated_at": {"type": "string"}
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/repos/{owner}/{repo}/pulls": {
-            "get": {
-                "operationId": "list_pull_requests",
-                "summary": "List pull requests in a repository",
-                "description": "Get a list of pull requests for a specific repository.",
-                "parameters": [
-                    {
-                        "name": "owner",
-                        "in": "path",
-                        "description": "Repository owner",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "repo",
-                        "in": "path",
-                        "description": "Repository name",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "state",
-                        "in": "query",
-                        "description": "Filter by state (open, closed, all)",
-                        "required": False,
-                        "schema": {
-                            "type": "string",
-                            "enum": ["open", "closed", "all"],
-                            "default": "open"
-                        }
-                    },
-                    {
-                        "name": "per_page",
-                        "in": "query",
-                        "description": "Number of results per page (max 100)",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 30
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "number": {"type": "integer"},
-                                            "title": {"type": "string"},
-                                            "state": {"type": "string"},
-                                            "user": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "login": {"type": "string"}
-                                                }
-                                            },
-                                            "created_at": {"type": "string"},
-                                            "updated_at": {"type": "string"},
-                                            "head": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "ref": {"type": "string"}
-                                                }
-                                            },
-                                            "base": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "ref": {"type": "string"}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    }
-}
+# The spec lives in github_api_spec.json next to this module. Only its bytes
+# are read at import, to key the tool cache; the dict is parsed on first use
+# of GITHUB_API_SPEC or on a cache miss. orjson's C parser is used when it is
+# installed; the stdlib json module produces the same dict otherwise. The spec
+# declares the bearer scheme but requires none: the shared HTTP client sends
+# the token, so ADK's per-call auth handling is skipped.
+GITHUB_API_SPEC_PATH = Path(__file__).with_name("github_api_spec.json")
+GITHUB_API_SPEC_BYTES = GITHUB_API_SPEC_PATH.read_bytes()
+
+
+@functools.cache
+def load_github_spec() -> dict:
+    """Parse the GitHub OpenAPI spec."""
+    return _json.loads(GITHUB_API_SPEC_BYTES)
 
 # ============================================================================
 # OPENAPI TOOLSET WITH AUTHENTICATION
 # ============================================================================
 
-# Get GitHub token from environment
-github_token = os.getenv("GITHUB_TOKEN")
-
-if not github_token:
-    print("WARNING: GITHUB_TOKEN not found in environment variables.")
-    print("Please set GITHUB_TOKEN in your .env file to use this agent.")
-    github_token = ""  # Provide empty string to avoid None errors
-
-# Create authentication scheme and credential using helper function
-# GitHub uses Bearer token in the Authorization header
-auth_scheme, auth_credential = token_to_scheme_credential(
-    "apikey",                    # Type: use "apikey" for header-based auth
-    "header",                    # Location: token goes in header
-    "Authorization",             # Key name: the header name
-    f"Bearer {github_token}"     # Key value: token with Bearer prefix
-)
-
-# Create OpenAPIToolset with authentication
-# ADK will automatically generate 7 tools:
+# Build the toolset (the token is sent by the shared client, see below)
+# ADK's OpenAPI parser generates 8 tools:
 # - list_user_repositories(per_page: int, page: int) - List user's repositories
-# - list_pull_requests(owner: str, repo: str, state: str, per_page: int) - List PRs in a repo
+# - list_pull_requests(owner: str, repo: str, state: str, per_page: int, page: int) - List PRs in a repo
 # - get_pull_request(owner: str, repo: str, pull_number: int) - Get PR details
 # - list_review_comments(owner: str, repo: str, pull_number: int) - Get review comments
 # - create_review_comment(owner: str, repo: str, pull_number: int, body: str, commit_id: str, path: str, line: int) - Add line comment
+# - create_review_with_comments(owner: str, repo: str, pull_number: int, commit_id: str, event: str, body: str, comments: list) - Add many line comments in one review
 # - list_pull_request_files(owner: str, repo: str, pull_number: int) - List changed files
 # - create_issue_comment(owner: str, repo: str, issue_number: int, body: str) - Add general comment
-github_toolset = OpenAPIToolset(
-    spec_dict=GITHUB_API_SPEC,
-    auth_scheme=auth_scheme,
-    auth_credential=auth_credential
+# (COMPOSITE TOOLS below run several of these reads concurrently)
+#
+# One connection pool shared by every GitHub tool call, so TLS handshakes with
+# api.github.com are paid once rather than per call. With h2 installed the pool
+# speaks HTTP/2, so concurrent calls multiplex over a single connection.
+# RestApiTool closes the client returned by httpx_client_factory after each
+# call, so the client wraps the shared pool in a transport whose close is a
+# no-op.
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Delegate to a long-lived transport without closing it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+# Read tools are often repeated within a conversation ("summarize PR #12",
+# then "check it for security issues"), so GitHub GET responses are reused for
+# a short while instead of fetched again. GitHub itself marks them
+# max-age=60. Once an entry expires it is revalidated with If-None-Match /
+# If-Modified-Since rather than dropped: GitHub answers 304 Not Modified
+# without counting it against the rate limit, and the stored body is reused.
+GITHUB_CACHE_TTL = 60.0
+GITHUB_CACHE_SIZE = 256
+
+
+class ResponseCache:
+    """
+    LRU of recent GitHub GET responses, each reused for ttl_seconds.
+
+    Keys are the full URL plus the Authorization header, so different tokens
+    never share entries. Bodies are kept as received (still compressed), and
+    only 200 responses are stored. Expired entries carrying an ETag or
+    Last-Modified header stay stored until evicted, so they can be revalidated.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple[str, str], tuple[float, httpx.Headers, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(request: httpx.Request) -> tuple[str, str]:
+        """Build the cache key for a request."""
+        return str(request.url), request.headers.get("authorization", "")
+
+    def get(self, key: tuple[str, str]) -> Optional[httpx.Response]:
+        """Return a fresh copy of a live entry, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, headers, content = entry
+        if expires_at < time.monotonic():
+            if "etag" not in headers and "last-modified" not in headers:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return httpx.Response(200, headers=headers, content=content)
+
+    def peek(self, key: tuple[str, str]) -> Optional[tuple[httpx.Headers, bytes]]:
+        """Return the stored headers and body, fresh or expired, or None."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1:]
+
+    @staticmethod
+    def validators(headers: httpx.Headers) -> dict[str, str]:
+        """Conditional request headers that revalidate a stored response."""
+        conditions = {}
+        if "etag" in headers:
+            conditions["If-None-Match"] = headers["etag"]
+        if "last-modified" in headers:
+            conditions["If-Modified-Since"] = headers["last-modified"]
+        return conditions
+
+    def put(self, key: tuple[str, str], headers: httpx.Headers, content: bytes):
+        """Store a response, evicting the least recently used entries if full."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, headers, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry."""
+        self._entries.clear()
+
+
+github_response_cache = ResponseCache(GITHUB_CACHE_TTL, GITHUB_CACHE_SIZE)
+
+
+class _CachingTransport(httpx.AsyncBaseTransport):
+    """
+    Answer repeated GETs from a ResponseCache and pass the rest through.
+
+    Expired entries are revalidated with a conditional GET, and a 304 renews
+    the stored response instead of downloading it again.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: ResponseCache):
+        self._transport = transport
+        self._cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            # A comment or review may change what the read endpoints return
+            self._cache.clear()
+            return await self._transport.handle_async_request(request)
+
+        key = self._cache.make_key(request)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        stale = self._cache.peek(key)
+        if stale is not None:
+            request.headers.update(self._cache.validators(stale[0]))
+
+        response = await self._transport.handle_async_request(request)
+        if response.status_code == 304 and stale is not None:
+            await response.aclose()
+            headers, content = stale
+            self._cache.put(key, headers, content)
+            return httpx.Response(
+                200, headers=headers, content=content, extensions=response.extensions
+            )
+        if response.status_code != 200:
+            return response
+        try:
+            content = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        self._cache.put(key, response.headers, content)
+        return httpx.Response(
+            200, headers=response.headers, content=content, extensions=response.extensions
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+@functools.cache
+def github_http_transport() -> httpx.AsyncHTTPTransport:
+    """The shared pool, created on first use since its SSL setup is slow."""
+    return httpx.AsyncHTTPTransport(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=20,
+            max_keepalive_connections=10,
+            keepalive_expiry=75.0
+        ),
+    )
+
+
+@functools.cache
+def github_auth_headers() -> dict:
+    """Authorization header for the GitHub token, built once."""
+    # Get GitHub token from environment
+    github_token = os.getenv("GITHUB_TOKEN")
+
+    if not github_token:
+        print("WARNING: GITHUB_TOKEN not found in environment variables.")
+        print("Please set GITHUB_TOKEN in your .env file to use this agent.")
+        github_token = ""  # Provide empty string to avoid None errors
+
+    # GitHub uses Bearer token in the Authorization header
+    return {"Authorization": f"Bearer {github_token}"}
+
+
+def github_http_client() -> httpx.AsyncClient:
+    """Client factory for the GitHub tools, backed by the shared pool."""
+    # The token is static, so it is sent as a default header on every client
+    # rather than configured as an ADK auth scheme that each tool call
+    # resolves again
+    return httpx.AsyncClient(
+        transport=_CachingTransport(
+            _SharedTransport(github_http_transport()), github_response_cache
+        ),
+        headers=github_auth_headers(),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+async def warm_up_github_connections() -> None:
+    """Open a pooled connection to api.github.com ahead of traffic."""
+    async with github_http_client() as client:
+        await client.head("https://api.github.com")
+
+
+async def close_github_connections() -> None:
+    """Close the shared pool, if any tool call opened it."""
+    if github_http_transport.cache_info().currsize:
+        await github_http_transport().aclose()
+        github_http_transport.cache_clear()
+
+
+# Parsing the spec into tools runs on every process start. The parsed tools are
+# pickled into this directory, keyed by a hash of the spec, the ADK version and
+# this module's name (the tools refer to its client factory), so later starts
+# load them instead of parsing again. The tools hold no credentials; the token
+# is added by the client factory, so it is never written to disk.
+TOOLSET_CACHE_DIR = Path(
+    os.getenv("ADK_TOOLSET_CACHE_DIR", Path.home() / ".cache" / "adk")
 )
 
 
+def private_cache_dir() -> Optional[Path]:
+    """Return TOOLSET_CACHE_DIR, created 0700, if only this user can write it.
+
+    Anyone who can plant a file in the directory gets code run in this process
+    when the file is unpickled, so a directory owned by another user, or
+    writable by group or others, is not used and nothing is cached.
+    """
+    try:
+        TOOLSET_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = TOOLSET_CACHE_DIR.stat()
+    except OSError:
+        return None  # Caching is best-effort; a read-only home still works
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+        print(f"Warning: not using {TOOLSET_CACHE_DIR}, others can write to it")
+        return None
+    return TOOLSET_CACHE_DIR
+
+
+def load_github_tools(spec_bytes: bytes) -> list:
+    """Return the tools for a spec, from the cache when possible."""
+    key = hashlib.blake2b(
+        spec_bytes + adk_version.encode() + __name__.encode(), digest_size=16
+    ).hexdigest()
+    cache_dir = private_cache_dir()
+    cache_file = cache_dir / f"github-tools-{key}.pkl" if cache_dir else None
+
+    if cache_file is not None:
+        try:
+            return pickle.loads(cache_file.read_bytes())
+        except Exception:
+            pass  # Missing or unreadable cache entry: build it below
+
+    tools = [
+        RestApiTool.from_parsed_operation(
+            operation, httpx_client_factory=github_http_client
+        )
+        for operation in OpenApiSpecParser().parse(_json.loads(spec_bytes))
+    ]
+
+    if cache_file is not None:
+        try:
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_bytes(pickle.dumps(tools))
+            tmp_file.replace(cache_file)
+        except OSError:
+            pass  # Caching is best-effort; a read-only home still works
+
+    return tools
+
+
+class CachedToolset(BaseToolset):
+    """Toolset serving prebuilt RestApiTools."""
+
+    def __init__(self, tools: list):
+        super().__init__()
+        self._tools = tools
+
+    async def get_tools(self, readonly_context=None) -> list:
+        return [
+            tool
+            for tool in self._tools
+            if self._is_tool_selected(tool, readonly_context)
+        ]
+
+    def get_tool(self, tool_name: str):
+        return next((tool for tool in self._tools if tool.name == tool_name), None)
+
+
+@functools.cache
+def load_github_toolset() -> CachedToolset:
+    """Build the GitHub toolset on first use."""
+    github_auth_headers()  # Warn about a missing token when the agent is built
+    return CachedToolset(load_github_tools(GITHUB_API_SPEC_BYTES))
+
+
 # mistake in tutorial
 # github_toolset = OpenAPIToolset(
 #     spec_dict=GITHUB_API_SPEC,
@@ -587,82 +355,361 @@ github_toolset = OpenAPIToolset(
 
 
 # ============================================================================
-# AGENT DEFINITION
+# TOOL RESULT SHAPING
 # ============================================================================
 
-root_agent = Agent(
-    name="github_review_agent",
-    model="gemini-2.0-flash",
+# GitHub's JSON is far larger than what a review needs: every PR embeds full
+# repository objects for head and base, plus dozens of URLs. Tool results are
+# projected onto the 200/201 response schemas in the spec, which list exactly
+# the fields the workflow uses, before they reach the model. Patches from
+# list_pull_request_files can still run to tens of KB each, so they are also
+# cut at MAX_PATCH_CHARS.
+MAX_PATCH_CHARS = 20_000
+
 
-    description="""
+@functools.cache
+def response_schemas() -> dict:
+    """Map each operationId to the success response schema in the spec."""
+    schemas = {}
+    for path_item in load_github_spec()["paths"].values():
+        for operation in path_item.values():
+            responses = operation.get("responses", {})
+            for status in ("200", "201"):
+                schema = (
+                    responses.get(status, {})
+                    .get("content", {})
+                    .get("application/json", {})
+                    .get("schema")
+                )
+                if schema:
+                    schemas[operation["operationId"]] = schema
+                    break
+    return schemas
+
+
+def _project(value, schema: dict):
+    """Keep only the fields a response schema declares."""
+    if isinstance(value, list) and "items" in schema:
+        return [_project(item, schema["items"]) for item in value]
+    properties = schema.get("properties")
+    if isinstance(value, dict) and properties:
+        return {
+            key: _project(value[key], properties[key])
+            for key in properties
+            if key in value
+        }
+    return value
+
+
+def _trim_patches(files) -> None:
+    """Shorten oversized patches in a list of PR files, in place."""
+    for file in files:
+        patch = file.get("patch") if isinstance(file, dict) else None
+        if patch and len(patch) > MAX_PATCH_CHARS:
+            file["patch"] = (
+                patch[:MAX_PATCH_CHARS]
+                + f"\n... [patch truncated, {len(patch) - MAX_PATCH_CHARS} more characters]"
+            )
+            file["patch_truncated"] = True
+
+
+def shape_result(tool_name: str, result):
+    """Project a generated tool's result for the model and trim its patches."""
+    schema = response_schemas().get(tool_name)
+    if schema is None or (isinstance(result, dict) and result.keys() & {"error", "pending", "text"}):
+        return result  # Not a GitHub tool, or an error/auth/non-JSON result
+    result = _project(result, schema)
+    if tool_name == "list_pull_request_files" and isinstance(result, list):
+        _trim_patches(result)
+    return result
+
+
+def shape_tool_result(tool, args, tool_context, tool_response):
+    """After-tool callback applying shape_result to the generated tools."""
+    if tool.name not in response_schemas():
+        return None  # Composite tools shape their own results
+    return shape_result(tool.name, tool_response)
+
+
+async def run_github_tool(tool_name: str, args: dict, tool_context: ToolContext):
+    """Run a generated tool directly, shaping its result like the callback does."""
+    tool = load_github_toolset().get_tool(tool_name)
+    return shape_result(tool_name, await tool.run_async(args=args, tool_context=tool_context))
+
+# ============================================================================
+# COMPOSITE TOOLS
+# ============================================================================
+
+# A review starts from three reads that only need the PR number. Issuing them
+# from one tool runs them concurrently over the shared pool, instead of the
+# model spending a round trip on each.
+PR_REVIEW_BUNDLE = {
+    "pull_request": "get_pull_request",
+    "files": "list_pull_request_files",
+    "review_comments": "list_review_comments",
+}
+
+
+async def fetch_pr_review_bundle(
+    owner: str, repo: str, pull_number: int, tool_context: ToolContext
+) -> dict:
+    """
+    Fetch a pull request's details, changed files and review comments at once.
+
+    Args:
+        owner: Repository owner, e.g. "facebook"
+        repo: Repository name, e.g. "react"
+        pull_number: Pull request number
+
+    Returns:
+        The get_pull_request, list_pull_request_files and list_review_comments
+        results under "pull_request", "files" and "review_comments".
+    """
+    results = await asyncio.gather(*(
+        run_github_tool(
+            tool_name,
+            {"owner": owner, "repo": repo, "pull_number": pull_number},
+            tool_context
+        )
+        for tool_name in PR_REVIEW_BUNDLE.values()
+    ))
+    return dict(zip(PR_REVIEW_BUNDLE, results))
+
+
+# Batch tools fan one request per PR out over the shared pool, but cap how many
+# are in flight so a large batch stays clear of GitHub's secondary rate limits.
+MAX_CONCURRENT_REQUESTS = 5
+
+
+async def execute_batch(calls, max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> list:
+    """
+    Await coroutines with at most max_concurrency running at once.
+
+    Results are returned in order. A call that raises is reported as an
+    {"error": ...} result, like RestApiTool reports HTTP failures, so one bad
+    PR doesn't fail the whole batch.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(call):
+        async with semaphore:
+            try:
+                return await call
+            except Exception as e:
+                return {"error": str(e)}
+
+    return await asyncio.gather(*(bounded(call) for call in calls))
+
+
+async def _run_for_pull_requests(
+    tool_name: str, owner: str, repo: str, pull_numbers: list[int], tool_context: ToolContext
+) -> dict:
+    """Run one generated tool for each PR, keyed by PR number."""
+    results = await execute_batch(
+        run_github_tool(
+            tool_name,
+            {"owner": owner, "repo": repo, "pull_number": pull_number},
+            tool_context
+        )
+        for pull_number in pull_numbers
+    )
+    return {str(pull_number): result for pull_number, result in zip(pull_numbers, results)}
+
+
+async def batch_pr_metadata(
+    owner: str, repo: str, pull_numbers: list[int], tool_context: ToolContext
+) -> dict:
+    """
+    Get the details of several pull requests in one repository at once.
+
+    Args:
+        owner: Repository owner, e.g. "facebook"
+        repo: Repository name, e.g. "react"
+        pull_numbers: Pull request numbers
+
+    Returns:
+        Each PR's get_pull_request result, keyed by PR number.
+    """
+    return await _run_for_pull_requests(
+        "get_pull_request", owner, repo, pull_numbers, tool_context
+    )
+
+
+async def batch_review_comments(
+    owner: str, repo: str, pull_numbers: list[int], tool_context: ToolContext
+) -> dict:
+    """
+    Get the review comments of several pull requests in one repository at once.
+
+    Args:
+        owner: Repository owner, e.g. "facebook"
+        repo: Repository name, e.g. "react"
+        pull_numbers: Pull request numbers
+
+    Returns:
+        Each PR's list_review_comments result, keyed by PR number.
+    """
+    return await _run_for_pull_requests(
+        "list_review_comments", owner, repo, pull_numbers, tool_context
+    )
+
+
+# The list endpoints return at most 100 items per page. GitHub's Link header
+# isn't visible through RestApiTool, so a short page marks the end. Once the
+# first page comes back full, a few later pages are requested concurrently
+# instead of one round trip at a time; at worst a couple of empty pages are
+# fetched past the end. Results are capped to keep the model's context sane.
+PAGE_SIZE = 100
+PREFETCH_PAGES = 3
+MAX_PAGES = 10
+
+
+async def paginate(tool_name: str, args: dict, tool_context: ToolContext):
+    """
+    Yield each page of a list tool's results, in order.
+
+    Stops after a short page, an error result or MAX_PAGES pages. Pages
+    requested past the end are cancelled.
+    """
+    def fetch(page: int) -> asyncio.Future:
+        return asyncio.ensure_future(run_github_tool(
+            tool_name, {**args, "per_page": PAGE_SIZE, "page": page}, tool_context
+        ))
+
+    in_flight = deque([fetch(1)])
+    next_page = 2
+    try:
+        while in_flight:
+            result = await in_flight.popleft()
+            full = isinstance(result, list) and len(result) == PAGE_SIZE
+            if not full:
+                yield result
+                return
+            while len(in_flight) < PREFETCH_PAGES and next_page <= MAX_PAGES:
+                in_flight.append(fetch(next_page))
+                next_page += 1
+            yield result
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+async def _collect_pages(tool_name: str, args: dict, tool_context: ToolContext) -> dict:
+    """Gather every page of a list tool into one result."""
+    items = []
+    pages = 0
+    async for result in paginate(tool_name, args, tool_context):
+        if not isinstance(result, list):
+            return result  # Error from the page request
+        items.extend(result)
+        pages += 1
+    return {
+        "items": items,
+        "count": len(items),
+        "truncated": pages == MAX_PAGES and len(items) == MAX_PAGES * PAGE_SIZE
+    }
+
+
+async def list_all_pull_requests(
+    owner: str, repo: str, state: str = "open", *, tool_context: ToolContext
+) -> dict:
+    """
+    List every pull request in a repository, across all result pages.
+
+    Args:
+        owner: Repository owner, e.g. "facebook"
+        repo: Repository name, e.g. "react"
+        state: "open", "closed" or "all"
+
+    Returns:
+        The pull requests under "items", with "truncated" set when more than
+        1,000 exist.
+    """
+    return await _collect_pages(
+        "list_pull_requests", {"owner": owner, "repo": repo, "state": state}, tool_context
+    )
+
+
+async def list_all_user_repositories(*, tool_context: ToolContext) -> dict:
+    """
+    List every repository of the authenticated user, across all result pages.
+
+    Returns:
+        The repositories under "items", with "truncated" set when more than
+        1,000 exist.
+    """
+    return await _collect_pages("list_user_repositories", {}, tool_context)
+
+# ============================================================================
+# AGENT DEFINITION
+# ============================================================================
+
+GITHUB_AGENT_DESCRIPTION = """
     GitHub code review assistant that can analyze pull requests, review code,
     and provide feedback using the GitHub API via OpenAPI tools.
-    """,
-
-    instruction="""
-    You are an expert code review assistant for GitHub pull requests!
-
-    CAPABILITIES:
-    - List repositories for the authenticated user
-    - List pull requests in a repository (open, closed, or all)
-    - Get PR details (title, description, changes, metadata)
-    - List files changed in a PR with diffs
-    - View existing review comments
-    - Add review comments (line-specific or general)
-    - Analyze code for potential issues
-
-    WORKFLOW FOR DISCOVERING WORK:
-    1. Use list_user_repositories to see available repositories
-    2. Use list_pull_requests to find PRs in a specific repo
-    3. Proceed with code review workflow
-
-    WORKFLOW FOR CODE REVIEW:
-    1. Use get_pull_request to understand the PR context
-    2. Use list_pull_request_files to see what changed
-    3. Analyze the code changes for:
-       - Security vulnerabilities (SQL injection, XSS, hardcoded secrets, etc.)
-       - Code quality issues (complexity, duplication, naming)
-       - Best practices violations
-       - Performance concerns
-       - Missing error handling
-       - Documentation needs
-    4. Use list_review_comments to see existing feedback
-    5. Use create_issue_comment for general PR feedback
-    6. Use create_review_comment for line-specific issues (requires commit_id from PR)
+    """
+
+GITHUB_INSTRUCTION = """
+    You are an expert code review assistant for GitHub pull requests.
+    Repositories are "owner/repo" (e.g. "facebook/react"); PR numbers are
+    integers.
+
+    WORKFLOW:
+    1. Find work with list_user_repositories and list_pull_requests
+       (list_all_user_repositories / list_all_pull_requests for every page)
+    2. Load a PR with fetch_pr_review_bundle; for several PRs call
+       batch_pr_metadata / batch_review_comments once with all the numbers
+    3. Check the diffs for security, correctness, error handling,
+       performance, complexity, duplication, naming and documentation
+    4. Post general feedback with create_issue_comment, and line comments
+       together in one create_review_with_comments call
 
     REVIEW STYLE:
-    - Be constructive and helpful, not critical
-    - Explain WHY something is an issue
-    - Suggest specific improvements
+    - Be constructive: explain WHY something is an issue and suggest a fix
     - Acknowledge good practices
     - Prioritize security and correctness over style
     - Use markdown formatting in comments
 
-    SECURITY FOCUS AREAS:
-    - Authentication/authorization issues
-    - Input validation and sanitization
-    - SQL injection, XSS, CSRF vulnerabilities
-    - Hardcoded credentials or secrets
-    - Insecure dependencies
-    - Improper error handling that leaks info
-    - Missing rate limiting or access controls
-
-    IMPORTANT NOTES:
-    - Repository format: "owner/repo" (e.g., "facebook/react")
-    - PR numbers are integers (e.g., 123)
-    - For line comments, you need the commit SHA from get_pull_request
-    - The patch field in files shows the actual diff
-    - Be respectful - you're helping developers improve their code!
-
-    EXAMPLE INTERACTIONS:
-    - "Show me my repositories"
-    - "List open pull requests in myorg/myrepo"
-    - "Summarize the changes in PR #123 in myorg/myrepo"
-    - "Review PR #456 in user/project and check for security issues"
-    - "What files changed in PR #789?"
-    - "Add a comment to PR #111 about the authentication concern"
-    """,
-
-    # Pass the toolset to the agent
-    tools=[github_toolset]
-)
+    SECURITY FOCUS: authentication/authorization, input validation, SQL
+    injection, XSS, CSRF, hardcoded secrets, insecure dependencies, errors
+    that leak information, missing rate limiting or access controls.
+    """
+
+# The spec, toolset and agent are built on first access of GITHUB_API_SPEC,
+# github_toolset or root_agent (PEP 562), so importing this module alongside
+# other agents costs nothing until the GitHub agent is actually used.
+
+@functools.cache
+def build_agent() -> Agent:
+    """Build the GitHub review agent."""
+    return Agent(
+        name="github_review_agent",
+        model="gemini-2.0-flash",
+
+        description=GITHUB_AGENT_DESCRIPTION,
+
+        instruction=GITHUB_INSTRUCTION,
+
+        # Pass the toolset and the composite tools to the agent
+        tools=[
+            load_github_toolset(),
+            fetch_pr_review_bundle,
+            batch_pr_metadata,
+            batch_review_comments,
+            list_all_pull_requests,
+            list_all_user_repositories
+        ],
+
+        # Keep GitHub's bulky responses and huge diffs out of the context
+        after_tool_callback=shape_tool_result
+    )
+
+
+def __getattr__(name: str):
+    if name == "root_agent":
+        return build_agent()
+    if name == "github_toolset":
+        return load_github_toolset()
+    if name == "GITHUB_API_SPEC":
+        return load_github_spec()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -10,37 +10,165 @@ This demonstrates how to manage multiple agents at scale with:
 """
 
 import asyncio
+import functools
+import hashlib
 import logging
 import os
-import uuid
-from contextlib import asynccontextmanager
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, NamedTuple
 
+import orjson
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from google.adk.errors.session_not_found_error import SessionNotFoundError
+from google.adk.events import Event
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.sessions import BaseSessionService, InMemorySessionService
 from google.genai import types
 
+from generation import agent_text, install_generation_callback, use_generation_config, user_message
+from responses import ModelResponse, NDJSONStreamingResponse, ORJSONResponse, ndjson_frame
+
 # Import your agents
-from agent import weather_agent
-from github_agent import root_agent as github_agent
+from agent import weather_agent, warm_up_weather_connections, weather_http_transport
+from github_agent import close_github_connections, root_agent as github_agent, warm_up_github_connections
 # from other_agents import customer_support_agent, sales_agent, analytics_agent
 
 load_dotenv()
 
+# ============================================================================
+# RESPONSE CACHE
+# ============================================================================
+
+class ResponseCache:
+    """
+    Exact-match cache of agent replies for stateless invocations.
+    
+    Keys hash the agent, generation settings and whitespace-normalized query,
+    so repeats of the same question skip the model round trip. Case is kept,
+    since branch names and file paths are case-sensitive. Entries expire
+    after a TTL and the oldest are evicted beyond max_size. Only agents
+    registered with cacheable=True are cached: replaying a reply to an agent
+    whose tools write would skip the write.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[float, str, int]]" = OrderedDict()
+    
+    @staticmethod
+    def make_key(agent_id: str, query: str, temperature: float, max_tokens: int) -> str:
+        """Build the cache key for an invocation."""
+        normalized = " ".join(query.split())
+        raw = f"{agent_id}\0{temperature}\0{max_tokens}\0{normalized}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[tuple[str, int]]:
+        """Return (response_text, tokens) for a live entry, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response_text, tokens = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response_text, tokens
+    
+    def put(self, key: str, response_text: str, tokens: int):
+        """Store a reply, evicting the least recently used entries if full."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response_text, tokens)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+# ============================================================================
+# SESSION RETENTION
+# ============================================================================
+
+class SessionTracker:
+    """
+    Bounded LRU of the sessions this API created in an in-memory store.
+    
+    Every invocation without a session_id creates a session, and the
+    in-memory store keeps each one forever. Sessions idle for longer than the
+    TTL, and the least recently used beyond max_size, are handed back for
+    deletion so memory stays bounded. Sessions are never shared between
+    callers.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple[str, str], float]" = OrderedDict()
+    
+    def touch(self, app_name: str, session_id: str, created: bool = False):
+        """Mark a session as used; only created sessions start being tracked."""
+        key = (app_name, session_id)
+        if created or key in self._entries:
+            self._entries[key] = time.monotonic()
+            self._entries.move_to_end(key)
+    
+    def evict(self) -> List[tuple[str, str]]:
+        """Stop tracking and return (app_name, session_id) pairs to delete."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        entries = self._entries
+        evicted = []
+        while entries:
+            key, last_used = next(iter(entries.items()))
+            if last_used >= cutoff and len(entries) <= self.max_size:
+                break
+            entries.popitem(last=False)
+            evicted.append(key)
+        return evicted
+
 # ============================================================================
 # AGENT REGISTRY PATTERN
 # ============================================================================
 
+# Per-agent counters, in column order of the registry's metrics table
+METRIC_FIELDS = ("total_requests", "successful_requests", "failed_requests", "total_tokens")
+TOTAL, SUCCESSFUL, FAILED, TOKENS = range(len(METRIC_FIELDS))
+METRIC_WIDTH = len(METRIC_FIELDS)
+# Pending metric updates are spilled into the table on this interval, or
+# sooner when metrics are read
+METRIC_FLUSH_INTERVAL = 0.05
+# Pending updates for a slot are packed into one Python int: request, success
+# and failure counts in 24-bit fields (16M requests per flush) with tokens in
+# the unbounded high bits. Recording a request is then a single integer add.
+PACK_BITS = 24
+PACK_MASK = (1 << PACK_BITS) - 1
+TOKEN_SHIFT = 3 * PACK_BITS
+SUCCESS_DELTA = 1 | (1 << PACK_BITS)
+FAILURE_DELTA = 1 | (1 << 2 * PACK_BITS)
+# JSON object for one metrics row, filled from the table with %-formatting
+METRICS_JSON_TEMPLATE = ("{" + ",".join(f'"{field}":%d' for field in METRIC_FIELDS) + "}").encode()
+# Seconds clients may reuse a GET /agents body before revalidating its ETag
+LISTING_MAX_AGE = 30
+
+class AgentBinding(NamedTuple):
+    """An agent and the static details captured when it was registered."""
+    agent: Any
+    name: str
+    model: str
+    description: str
+    # Whether stateless replies may be served from the response cache
+    cacheable: bool = False
+
 class AgentRegistry:
     """
     Central registry for all agents in the system.
@@ -48,75 +176,268 @@ class AgentRegistry:
     """
     
     def __init__(self):
-        self._agents: Dict[str, Any] = {}
-        self._runners: Dict[str, Runner] = {}
-        self._metrics: Dict[str, Dict[str, int]] = {}
-        self.session_service = InMemorySessionService()
-    
-    def register_agent(self, agent_id: str, agent: Any, description: str = ""):
-        """Register an agent in the system."""
-        self._agents[agent_id] = {
-            "agent": agent,
-            "description": description,
-            "name": agent.name,
-            "model": agent.model
-        }
+        # Each agent gets an integer slot at registration. Requests resolve
+        # their agent_id to a slot once, then every per-agent lookup (agent,
+        # runner, metrics row) is a list index instead of a dict probe.
+        self._slots: Dict[str, int] = {}
+        self._agent_ids: List[str] = []
+        self._agents: List[AgentBinding] = []
+        self._runners: List[Optional[Runner]] = []
+        # Metrics live in one contiguous int64 table with a row per slot, so a
+        # counter bump is an indexed store instead of nested dict lookups
+        self._metric_table = array("q")
+        # Running sums of every row, kept in step by flush_metrics() so the
+        # health check reads system totals without walking all agents
+        self._system_totals = array("q", [0] * METRIC_WIDTH)
+        # Request handlers only add a packed delta to their slot's entry here;
+        # the background flusher unpacks and spills them into the table
+        self._pending_metrics: List[int] = []
+        # Pre-serialized `"agent_id":{...,"metrics":` fragments for GET /agents,
+        # rebuilt only on registration; live metrics are spliced in per call
+        self._listing_prefixes: List[bytes] = []
+        # Last assembled GET /agents body; dropped whenever a registration or
+        # a metrics flush changes what it would contain
+        self._listing_json: Optional[bytes] = None
+        # Strong ETag for _listing_json, hashed from the body so it stays
+        # valid across restarts and workers
+        self._listing_etag = ""
+        self._lock = threading.Lock()
+        self.session_service = self._create_session_service()
+        self.response_cache = ResponseCache(
+            ttl_seconds=settings.response_cache_ttl,
+            max_size=settings.response_cache_size
+        )
+        # Database-backed stores are shared with other workers and keep their
+        # own retention, so only in-memory sessions are pruned here
+        self.session_tracker = (
+            SessionTracker(settings.session_ttl, settings.max_sessions)
+            if isinstance(self.session_service, InMemorySessionService) and settings.session_ttl > 0
+            else None
+        )
+    
+    @staticmethod
+    def _create_session_service() -> BaseSessionService:
+        """
+        Session store shared by every runner.
         
-        # Create runner for this agent
-        self._runners[agent_id] = Runner(
-            app_name=f"{agent_id}_app",
+        In-memory sessions are private to one worker and lost on restart. With
+        SESSION_DB_URL set, sessions live in a database that all workers share.
+        """
+        if settings.session_db_url:
+            # Imported lazily since it needs the google-adk[db] extra
+            from google.adk.sessions import DatabaseSessionService
+            return DatabaseSessionService(db_url=settings.session_db_url)
+        return InMemorySessionService()
+    
+    @staticmethod
+    def build_entry(agent: Any, description: str = "", cacheable: bool = False) -> AgentBinding:
+        """Build the registry entry for an agent, without touching shared state."""
+        return AgentBinding(
             agent=agent,
-            session_service=self.session_service
+            name=agent.name,
+            model=agent.model,
+            description=description,
+            cacheable=cacheable
         )
+    
+    async def track_session(self, app_name: str, session_id: str, created: bool = False):
+        """Record use of an API session and delete any that have expired."""
+        tracker = self.session_tracker
+        if tracker is None:
+            return
+        tracker.touch(app_name, session_id, created)
+        for expired_app, expired_id in tracker.evict():
+            await self.session_service.delete_session(
+                app_name=expired_app,
+                user_id="api_user",
+                session_id=expired_id
+            )
+    
+    def register_agent(
+        self, agent_id: str, agent: Any, description: str = "", cacheable: bool = False
+    ):
+        """
+        Register an agent in the system.
         
-        # Initialize metrics
-        self._metrics[agent_id] = {
-            "total_requests": 0,
-            "successful_requests": 0,
-            "failed_requests": 0,
-            "total_tokens": 0
-        }
+        Set cacheable only for agents whose replies may be replayed, i.e.
+        whose tools are read-only.
+        """
+        self._install(agent_id, self.build_entry(agent, description, cacheable))
+    
+    async def register_agents(self, manifest: List[tuple]):
+        """
+        Register (agent_id, agent, description[, cacheable]) entries concurrently.
         
-        logger.info(f"✅ Registered agent: {agent_id} ({agent.name})")
+        Entries are built in worker threads so slow agent setup overlaps,
+        then merged into the registry one at a time.
+        """
+        entries = await asyncio.gather(*(
+            asyncio.to_thread(self.build_entry, *entry[1:])
+            for entry in manifest
+        ))
+        for entry, info in zip(manifest, entries):
+            self._install(entry[0], info)
+    
+    def _install(self, agent_id: str, binding: AgentBinding):
+        """Place a built entry in its slot, reusing the slot on re-registration."""
+        # Per-request temperature/max tokens are applied by this callback
+        # rather than by mutating the shared agent's config
+        install_generation_callback(binding.agent)
+        with self._lock:
+            self._listing_json = None
+            slot = self._slots.get(agent_id)
+            if slot is None:
+                slot = self._slots[agent_id] = len(self._agents)
+                self._agent_ids.append(agent_id)
+                self._agents.append(binding)
+                # Runners are built on first use by runner_at(), so agents that a
+                # worker never invokes cost nothing at startup
+                self._runners.append(None)
+                self._metric_table.extend([0] * METRIC_WIDTH)
+                self._pending_metrics.append(0)
+                self._listing_prefixes.append(self._listing_prefix(agent_id, binding))
+            else:
+                self._agents[slot] = binding
+                self._runners[slot] = None
+                base = slot * METRIC_WIDTH
+                for column in range(METRIC_WIDTH):
+                    self._system_totals[column] -= self._metric_table[base + column]
+                self._metric_table[base:base + METRIC_WIDTH] = array("q", [0] * METRIC_WIDTH)
+                self._pending_metrics[slot] = 0
+                self._listing_prefixes[slot] = self._listing_prefix(agent_id, binding)
+        
+        logger.info("✅ Registered agent: %s (%s)", agent_id, binding.name)
+    
+    @property
+    def agent_ids(self) -> List[str]:
+        """IDs of all registered agents, without gathering their metrics."""
+        return list(self._agent_ids)
+    
+    def resolve(self, agent_id: str) -> Optional[int]:
+        """Map an agent ID to its registry slot, or None if unknown."""
+        return self._slots.get(agent_id)
+    
+    def binding_at(self, slot: int) -> AgentBinding:
+        """Get the registration details for a slot."""
+        return self._agents[slot]
+    
+    def agent_at(self, slot: int) -> Any:
+        """Get the agent registered in a slot."""
+        return self._agents[slot].agent
+    
+    def runner_at(self, slot: int) -> Runner:
+        """Get the runner for a slot, creating it on first use."""
+        runner = self._runners[slot]
+        if runner is None:
+            runner = self._runners[slot] = Runner(
+                app_name=f"{self._agent_ids[slot]}_app",
+                agent=self._agents[slot].agent,
+                session_service=self.session_service
+            )
+        return runner
     
     def get_agent(self, agent_id: str) -> Optional[Any]:
         """Get agent by ID."""
-        return self._agents.get(agent_id, {}).get("agent")
+        slot = self._slots.get(agent_id)
+        return None if slot is None else self.agent_at(slot)
     
     def get_runner(self, agent_id: str) -> Optional[Runner]:
-        """Get runner for agent."""
-        return self._runners.get(agent_id)
-    
-    def list_agents(self) -> Dict[str, Dict[str, Any]]:
-        """List all registered agents."""
-        return {
-            agent_id: {
-                "name": info["name"],
-                "model": info["model"],
-                "description": info["description"],
-                "metrics": self._metrics.get(agent_id, {})
-            }
-            for agent_id, info in self._agents.items()
-        }
+        """Get runner for agent, creating it on first use."""
+        slot = self._slots.get(agent_id)
+        return None if slot is None else self.runner_at(slot)
+    
+    @staticmethod
+    def _listing_prefix(agent_id: str, binding: AgentBinding) -> bytes:
+        """Serialize the static part of an agent's GET /agents entry."""
+        info = orjson.dumps({
+            "agent_id": agent_id,
+            "name": binding.name,
+            "model": binding.model,
+            "description": binding.description
+        })
+        return orjson.dumps(agent_id) + b":" + info[:-1] + b',"metrics":'
+    
+    def listing_json(self) -> bytes:
+        """JSON body for GET /agents, in the shape of AgentListResponse."""
+        self.flush_metrics()
+        if self._listing_json is not None:
+            return self._listing_json
+        table = self._metric_table
+        entries = [
+            prefix + METRICS_JSON_TEMPLATE % tuple(table[slot * METRIC_WIDTH:(slot + 1) * METRIC_WIDTH]) + b"}"
+            for slot, prefix in enumerate(self._listing_prefixes)
+        ]
+        self._listing_json = b'{"agents":{%s},"total_agents":%d}' % (b",".join(entries), len(entries))
+        self._listing_etag = '"%s"' % hashlib.blake2b(self._listing_json, digest_size=16).hexdigest()
+        return self._listing_json
+    
+    def listing_etag(self) -> str:
+        """ETag of the current GET /agents body."""
+        self.listing_json()
+        return self._listing_etag
+    
+    def update_metrics_at(self, slot: int, success: bool, tokens: int = 0):
+        """Record a metrics update for the agent in a slot."""
+        if success:
+            self._pending_metrics[slot] += SUCCESS_DELTA + (tokens << TOKEN_SHIFT)
+        else:
+            self._pending_metrics[slot] += FAILURE_DELTA
+    
+    def flush_metrics(self):
+        """Spill all pending metrics updates into the metrics table."""
+        pending = self._pending_metrics
+        table = self._metric_table
+        totals = self._system_totals
+        for slot, packed in enumerate(pending):
+            if packed:
+                pending[slot] = 0
+                self._listing_json = None
+                base = slot * METRIC_WIDTH
+                requests = packed & PACK_MASK
+                successes = (packed >> PACK_BITS) & PACK_MASK
+                failures = (packed >> 2 * PACK_BITS) & PACK_MASK
+                tokens = packed >> TOKEN_SHIFT
+                table[base + TOTAL] += requests
+                table[base + SUCCESSFUL] += successes
+                table[base + FAILED] += failures
+                table[base + TOKENS] += tokens
+                totals[TOTAL] += requests
+                totals[SUCCESSFUL] += successes
+                totals[FAILED] += failures
+                totals[TOKENS] += tokens
+    
+    async def run_metrics_flusher(self):
+        """Background task that spills pending metrics updates periodically."""
+        try:
+            while True:
+                await asyncio.sleep(METRIC_FLUSH_INTERVAL)
+                self.flush_metrics()
+        finally:
+            self.flush_metrics()
     
     def update_metrics(self, agent_id: str, success: bool, tokens: int = 0):
         """Update metrics for an agent."""
-        if agent_id in self._metrics:
-            self._metrics[agent_id]["total_requests"] += 1
-            if success:
-                self._metrics[agent_id]["successful_requests"] += 1
-                self._metrics[agent_id]["total_tokens"] += tokens
-            else:
-                self._metrics[agent_id]["failed_requests"] += 1
+        slot = self._slots.get(agent_id)
+        if slot is not None:
+            self.update_metrics_at(slot, success, tokens)
+    
+    def metrics_at(self, slot: int) -> Dict[str, int]:
+        """Get metrics for the agent in a slot."""
+        self.flush_metrics()
+        base = slot * METRIC_WIDTH
+        return dict(zip(METRIC_FIELDS, self._metric_table[base:base + METRIC_WIDTH]))
+    
+    def system_totals(self) -> Dict[str, int]:
+        """Get metrics summed over all agents."""
+        self.flush_metrics()
+        return dict(zip(METRIC_FIELDS, self._system_totals))
     
     def get_metrics(self, agent_id: str) -> Dict[str, int]:
         """Get metrics for a specific agent."""
-        return self._metrics.get(agent_id, {})
+        slot = self._slots.get(agent_id)
+        return {} if slot is None else self.metrics_at(slot)
 
 
-# Global agent registry
-agent_registry = AgentRegistry()
-
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -146,11 +467,38 @@ class Settings(BaseSettings):
     max_query_length: int = 10000
     max_tokens: int = 4096
     
-    def get_allowed_origins(self) -> list[str]:
-        return [origin.strip() for origin in self.allowed_origins.split(",") if origin.strip()]
+    # Shared session store, e.g. postgresql+asyncpg://... or
+    # sqlite+aiosqlite:///./sessions.db (defaults to in-memory sessions)
+    session_db_url: Optional[str] = None
+    
+    # Response cache for requests without a session_id (0 disables it)
+    response_cache_ttl: int = 600
+    response_cache_size: int = 1024
+    
+    # Idle lifetime and cap for API-created in-memory sessions (0 keeps all)
+    session_ttl: int = 1800
+    max_sessions: int = 10000
+    
+    @functools.cached_property
+    def allowed_origin_set(self) -> frozenset[str]:
+        """Allowed origins, parsed once since the setting is fixed at startup."""
+        return frozenset(origin.strip() for origin in self.allowed_origins.split(",") if origin.strip())
 
 settings = Settings()
 
+# Read by every invocation, so hoisted out of the settings model. Settings
+# are fixed at startup, and a module global is the cheapest lookup there is.
+REQUEST_TIMEOUT = settings.request_timeout
+MAX_QUERY_LENGTH = settings.max_query_length
+RESPONSE_CACHE_TTL = settings.response_cache_ttl
+
+# Returned for a session_id the store no longer has, e.g. one pruned by the
+# SessionTracker after SESSION_TTL idle seconds
+SESSION_EXPIRED_DETAIL = "Session not found or expired; omit session_id to start a new one"
+
+# Global agent registry
+agent_registry = AgentRegistry()
+
 # ============================================================================
 # LOGGING
 # ============================================================================
@@ -165,48 +513,65 @@ logger = logging.getLogger(__name__)
 # LIFESPAN - REGISTER ALL AGENTS
 # ============================================================================
 
+# The weather and GitHub tools share long-lived connection pools. A HEAD to
+# each upstream at startup leaves an open connection in the pool, so the
+# first tool call skips the DNS, TCP and TLS setup. Model calls go through
+# the genai client's own pool, which this cannot reach.
+WARM_UP_TIMEOUT = 5.0
+
+
+async def warm_up_connections() -> None:
+    """Open the weather and GitHub tool pools, best-effort."""
+    try:
+        async with asyncio.timeout(WARM_UP_TIMEOUT):
+            results = await asyncio.gather(
+                warm_up_weather_connections(),
+                warm_up_github_connections(),
+                return_exceptions=True
+            )
+    except TimeoutError:
+        logger.warning("Connection warm-up timed out; continuing startup")
+        return
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        logger.warning("Connection warm-up skipped %d upstream(s): %r", len(failures), failures[0])
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan: register agents on startup."""
     logger.info("🚀 Enterprise Multi-Agent API starting up...")
     
-    # Register all your agents here
-    agent_registry.register_agent(
-        agent_id="weather",
-        agent=weather_agent,
-        description="Provides current weather and forecasts for any location worldwide"
-    )
+    # Register all your agents here: (agent_id, agent, description[, cacheable]).
+    # Only agents with read-only tools may be cacheable; the GitHub agent
+    # posts review comments, so its replies are never replayed.
+    await agent_registry.register_agents([
+        ("weather", weather_agent,
+         "Provides current weather and forecasts for any location worldwide", True),
+        ("github", github_agent,
+         "GitHub code review assistant that analyzes pull requests and provides feedback"),
+        # Example: Register more agents
+        # ("customer_support", customer_support_agent,
+        #  "Handles customer inquiries and support tickets"),
+        # ("sales", sales_agent,
+        #  "Assists with product information and sales inquiries"),
+        # ("analytics", analytics_agent,
+        #  "Provides business analytics and data insights"),
+    ])
     
-    agent_registry.register_agent(
-        agent_id="github",
-        agent=github_agent,
-        description="GitHub code review assistant that analyzes pull requests and provides feedback"
-    )
+    logger.info("📊 Registered %d agents", len(agent_registry.agent_ids))
     
-    # Example: Register more agents
-    # agent_registry.register_agent(
-    #     agent_id="customer_support",
-    #     agent=customer_support_agent,
-    #     description="Handles customer inquiries and support tickets"
-    # )
-    # 
-    # agent_registry.register_agent(
-    #     agent_id="sales",
-    #     agent=sales_agent,
-    #     description="Assists with product information and sales inquiries"
-    # )
-    # 
-    # agent_registry.register_agent(
-    #     agent_id="analytics",
-    #     agent=analytics_agent,
-    #     description="Provides business analytics and data insights"
-    # )
-    
-    logger.info(f"📊 Registered {len(agent_registry.list_agents())} agents")
+    await warm_up_connections()
+    metrics_flusher = asyncio.create_task(agent_registry.run_metrics_flusher())
     
     yield
     
     logger.info("🛑 Enterprise Multi-Agent API shutting down...")
+    metrics_flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await metrics_flusher
+    await weather_http_transport.aclose()
+    await close_github_connections()
 
 # ============================================================================
 # APP INITIALIZATION
@@ -216,12 +581,14 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Enterprise-scale multi-agent API with centralized routing and management",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.get_allowed_origins(),
+    # Starlette only tests membership, so the set makes each check O(1)
+    allow_origins=settings.allowed_origin_set,
     allow_credentials=False,
     allow_methods=["GET", "POST"],
     allow_headers=["Content-Type", "Authorization"],
@@ -233,23 +600,37 @@ app.add_middleware(
 
 class AgentInvokeRequest(BaseModel):
     """Request model for agent invocation."""
+    model_config = ConfigDict(frozen=True)
+    
     agent_id: str = Field(..., description="ID of the agent to invoke (e.g., 'weather', 'support')")
     query: str = Field(..., min_length=1, max_length=10000, description="Query for the agent")
     temperature: float = Field(0.7, ge=0.0, le=2.0, description="Temperature for generation")
     max_tokens: int = Field(2048, ge=1, le=4096, description="Max tokens in response")
     session_id: Optional[str] = Field(None, description="Optional session ID for conversation continuity")
+    no_cache: bool = Field(False, description="Skip the response cache, e.g. for sensitive prompts")
 
 class AgentInvokeResponse(BaseModel):
     """Response model for agent invocation."""
+    model_config = ConfigDict(frozen=True)
+    
     agent_id: str = Field(..., description="ID of the agent that processed the request")
     response: str = Field(..., description="Agent response text")
     model: str = Field(..., description="Model used")
     tokens: int = Field(..., description="Token count estimate")
     request_id: str = Field(..., description="Request tracking ID")
-    session_id: str = Field(..., description="Session ID for conversation continuity")
+    session_id: str = Field(
+        ...,
+        description=(
+            "Session ID for conversation continuity. In-memory sessions idle for "
+            f"more than {settings.session_ttl} seconds (SESSION_TTL) are deleted, "
+            "after which passing this ID returns 404"
+        )
+    )
 
 class AgentInfo(BaseModel):
     """Information about an agent."""
+    model_config = ConfigDict(frozen=True)
+    
     agent_id: str
     name: str
     model: str
@@ -258,6 +639,8 @@ class AgentInfo(BaseModel):
 
 class AgentListResponse(BaseModel):
     """Response model for listing agents."""
+    model_config = ConfigDict(frozen=True)
+    
     agents: Dict[str, AgentInfo]
     total_agents: int
 
@@ -265,25 +648,31 @@ class AgentListResponse(BaseModel):
 # ENDPOINTS
 # ============================================================================
 
-@app.get("/")
-async def root():
-    """Root endpoint with API information."""
-    return {
+@functools.lru_cache(maxsize=8)
+def root_payload(total_agents: int) -> bytes:
+    """Serialized root endpoint body; only the agent count ever changes."""
+    return orjson.dumps({
         "message": settings.app_name,
         "version": settings.app_version,
         "environment": settings.environment,
-        "total_agents": len(agent_registry.list_agents()),
+        "total_agents": total_agents,
         "endpoints": {
             "agents": "/agents (GET) - List all available agents",
             "invoke": "/invoke (POST) - Invoke any agent",
+            "invoke_stream": "/invoke/stream (POST) - Invoke an agent, streaming NDJSON",
             "agent_metrics": "/agents/{agent_id}/metrics (GET) - Get agent metrics",
             "health": "/health (GET) - Health check",
             "docs": "/docs - API documentation"
         }
-    }
+    })
+
+@app.get("/")
+async def root():
+    """Root endpoint with API information."""
+    return Response(root_payload(len(agent_registry.agent_ids)), media_type="application/json")
 
 @app.get("/agents", response_model=AgentListResponse)
-async def list_agents():
+async def list_agents(if_none_match: Optional[str] = Header(None)):
     """
     List all available agents in the system.
     
@@ -292,40 +681,39 @@ async def list_agents():
     - Model being used
     - Description of capabilities
     - Usage metrics
+    
+    Responses carry an ETag; clients that send it back in If-None-Match
+    get an empty 304 until an agent or its metrics change.
     """
-    agents_info = agent_registry.list_agents()
-    
-    agents_dict = {
-        agent_id: AgentInfo(
-            agent_id=agent_id,
-            name=info["name"],
-            model=info["model"],
-            description=info["description"],
-            metrics=info["metrics"]
-        )
-        for agent_id, info in agents_info.items()
+    # Static agent details are serialized once at registration; only the
+    # metrics are formatted per call
+    body = agent_registry.listing_json()
+    headers = {
+        "ETag": agent_registry.listing_etag(),
+        "Cache-Control": f"max-age={LISTING_MAX_AGE}, must-revalidate"
     }
-    
-    return AgentListResponse(
-        agents=agents_dict,
-        total_agents=len(agents_dict)
-    )
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or headers["ETag"] in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.get("/agents/{agent_id}/metrics")
 async def get_agent_metrics(agent_id: str):
     """Get detailed metrics for a specific agent."""
-    if not agent_registry.get_agent(agent_id):
+    slot = agent_registry.resolve(agent_id)
+    if slot is None:
         raise HTTPException(
             status_code=404,
             detail=f"Agent '{agent_id}' not found"
         )
     
-    metrics = agent_registry.get_metrics(agent_id)
-    agent_info = agent_registry.list_agents()[agent_id]
+    metrics = agent_registry.metrics_at(slot)
     
     return {
         "agent_id": agent_id,
-        "agent_name": agent_info["name"],
+        "agent_name": agent_registry.binding_at(slot).name,
         "metrics": metrics,
         "success_rate": (
             metrics["successful_requests"] / max(metrics["total_requests"], 1)
@@ -335,6 +723,27 @@ async def get_agent_metrics(agent_id: str):
         ) if metrics["successful_requests"] > 0 else 0
     }
 
+def resolve_invocation(request: AgentInvokeRequest) -> int:
+    """Validate an invocation and resolve its agent to a registry slot."""
+    # Resolve the agent once; everything after this indexes by slot
+    slot = agent_registry.resolve(request.agent_id)
+    
+    if slot is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Agent '{request.agent_id}' not found. "
+                   f"Available agents: {agent_registry.agent_ids}"
+        )
+    
+    # Validate query length
+    if len(request.query) > MAX_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query exceeds maximum length of {MAX_QUERY_LENGTH}"
+        )
+    
+    return slot
+
 @app.post("/invoke", response_model=AgentInvokeResponse)
 async def invoke_agent(request: AgentInvokeRequest):
     """
@@ -353,31 +762,31 @@ async def invoke_agent(request: AgentInvokeRequest):
     }
     ```
     """
-    request_id = str(uuid.uuid4())
+    request_id = os.urandom(16).hex()  # Opaque 128-bit ID, no UUID object
     
     logger.info(
-        f"invoke_agent.start - request_id={request_id} "
-        f"agent_id={request.agent_id} query_len={len(request.query)}"
+        "invoke_agent.start - request_id=%s agent_id=%s query_len=%d",
+        request_id, request.agent_id, len(request.query)
     )
     
     try:
-        # Get agent and runner
-        agent = agent_registry.get_agent(request.agent_id)
-        runner = agent_registry.get_runner(request.agent_id)
+        slot = resolve_invocation(request)
+        agent = agent_registry.agent_at(slot)
+        runner = agent_registry.runner_at(slot)
         
-        if not agent or not runner:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Agent '{request.agent_id}' not found. "
-                       f"Available agents: {list(agent_registry.list_agents().keys())}"
-            )
-        
-        # Validate query length
-        if len(request.query) > settings.max_query_length:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Query exceeds maximum length of {settings.max_query_length}"
+        # Stateless queries can be answered from the response cache
+        cache_key = None
+        cached = None
+        if (
+            agent_registry.binding_at(slot).cacheable
+            and not request.session_id
+            and not request.no_cache
+            and RESPONSE_CACHE_TTL > 0
+        ):
+            cache_key = ResponseCache.make_key(
+                request.agent_id, request.query, request.temperature, request.max_tokens
             )
+            cached = agent_registry.response_cache.get(cache_key)
         
         # Create or get session
         if request.session_id:
@@ -390,67 +799,91 @@ async def invoke_agent(request: AgentInvokeRequest):
                 user_id="api_user"
             )
             session_id = session.id
-        
-        # Update agent config
-        agent.generate_content_config = types.GenerateContentConfig(
-            temperature=request.temperature,
-            max_output_tokens=request.max_tokens
+        await agent_registry.track_session(
+            f"{request.agent_id}_app", session_id, created=not request.session_id
         )
         
+        if cached is not None:
+            # Record the exchange in the new session so follow-up turns
+            # still have it as context, then skip the model call
+            response_text, token_count = cached
+            await agent_registry.session_service.append_event(
+                session,
+                Event(author="user", content=user_message(request.query))
+            )
+            await agent_registry.session_service.append_event(
+                session,
+                Event(author=agent.name, content=types.Content(role="model", parts=[types.Part(text=response_text)]))
+            )
+            agent_registry.update_metrics_at(slot, success=True, tokens=token_count)
+            logger.info(
+                "invoke_agent.cache_hit - request_id=%s agent_id=%s tokens=%d",
+                request_id, request.agent_id, token_count
+            )
+            return ModelResponse(AgentInvokeResponse(
+                agent_id=request.agent_id,
+                response=response_text,
+                model=agent.model,
+                tokens=token_count,
+                request_id=request_id,
+                session_id=session_id
+            ))
+        
+        # Apply this request's generation settings
+        use_generation_config(request.temperature, request.max_tokens)
+        
         # Create message
-        new_message = types.Content(
-            role="user",
-            parts=[types.Part(text=request.query)]
-        )
+        new_message = user_message(request.query)
         
-        # Run agent with timeout
-        response_text = ""
+        # Run agent with timeout; text chunks are joined once at the end
+        chunks = []
+        token_count = 0  # Word count as a token estimate, summed per chunk
         try:
-            async with asyncio.timeout(settings.request_timeout):
-                async for event in runner.run_async(
-                    user_id="api_user",
-                    session_id=session_id,
-                    new_message=new_message
-                ):
-                    if event.content and event.content.parts:
-                        text = event.content.parts[0].text
-                        if text:
-                            response_text += text
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                async for text in agent_text(runner, session_id, new_message):
+                    chunks.append(text)
+                    token_count += len(text.split())
         except asyncio.TimeoutError:
-            agent_registry.update_metrics(request.agent_id, success=False)
+            agent_registry.update_metrics_at(slot, success=False)
             raise HTTPException(
                 status_code=504,
-                detail=f"Request exceeded {settings.request_timeout} second timeout"
+                detail=f"Request exceeded {REQUEST_TIMEOUT} second timeout"
             )
         
-        # Calculate tokens
-        token_count = len(response_text.split())
+        response_text = "".join(chunks)
         
         # Update metrics
-        agent_registry.update_metrics(request.agent_id, success=True, tokens=token_count)
+        agent_registry.update_metrics_at(slot, success=True, tokens=token_count)
+        
+        if cache_key is not None and response_text:
+            agent_registry.response_cache.put(cache_key, response_text, token_count)
         
         logger.info(
-            f"invoke_agent.success - request_id={request_id} "
-            f"agent_id={request.agent_id} tokens={token_count}"
+            "invoke_agent.success - request_id=%s agent_id=%s tokens=%d",
+            request_id, request.agent_id, token_count
         )
         
-        return AgentInvokeResponse(
+        return ModelResponse(AgentInvokeResponse(
             agent_id=request.agent_id,
             response=response_text,
             model=agent.model,
             tokens=token_count,
             request_id=request_id,
             session_id=session_id
-        )
+        ))
         
     except HTTPException:
         raise
     
+    except SessionNotFoundError:
+        # The caller's session expired or never existed; not an agent failure
+        raise HTTPException(status_code=404, detail=SESSION_EXPIRED_DETAIL)
+    
     except Exception as e:
         agent_registry.update_metrics(request.agent_id, success=False)
         logger.error(
-            f"invoke_agent.error - request_id={request_id} "
-            f"agent_id={request.agent_id} error={str(e)}",
+            "invoke_agent.error - request_id=%s agent_id=%s error=%s",
+            request_id, request.agent_id, e,
             exc_info=True
         )
         raise HTTPException(
@@ -458,31 +891,117 @@ async def invoke_agent(request: AgentInvokeRequest):
             detail="An unexpected error occurred"
         )
 
+@app.post("/invoke/stream")
+async def invoke_agent_stream(request: AgentInvokeRequest):
+    """
+    Invoke an agent and stream its output as newline-delimited JSON.
+    
+    Frames are sent as soon as the agent produces them, so clients see the
+    first text without waiting for the whole reply:
+    
+    ```
+    {"type": "start", "request_id": "...", "session_id": "...", "agent_id": "weather", "model": "..."}
+    {"type": "text", "text": "Let me check "}
+    {"type": "text", "text": "the weather..."}
+    {"type": "end", "tokens": 42}
+    ```
+    
+    A failure after the stream has started is reported as a final
+    `{"type": "error", "detail": "..."}` frame, with `"status": 404` when
+    the session_id has expired. Streamed replies always run
+    the agent; the response cache only serves `/invoke`.
+    """
+    request_id = os.urandom(16).hex()  # Opaque 128-bit ID, no UUID object
+    
+    logger.info(
+        "invoke_agent_stream.start - request_id=%s agent_id=%s query_len=%d",
+        request_id, request.agent_id, len(request.query)
+    )
+    
+    slot = resolve_invocation(request)
+    agent = agent_registry.agent_at(slot)
+    runner = agent_registry.runner_at(slot)
+    
+    if request.session_id:
+        session_id = request.session_id
+    else:
+        session = await agent_registry.session_service.create_session(
+            app_name=f"{request.agent_id}_app",
+            user_id="api_user"
+        )
+        session_id = session.id
+    await agent_registry.track_session(
+        f"{request.agent_id}_app", session_id, created=not request.session_id
+    )
+    
+    new_message = user_message(request.query)
+    
+    async def frames():
+        yield ndjson_frame({
+            "type": "start",
+            "request_id": request_id,
+            "session_id": session_id,
+            "agent_id": request.agent_id,
+            "model": agent.model
+        })
+        token_count = 0  # Word count as a token estimate, summed per chunk
+        # Set here, since the response body is iterated outside the handler
+        use_generation_config(request.temperature, request.max_tokens)
+        try:
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                async for text in agent_text(runner, session_id, new_message):
+                    token_count += len(text.split())
+                    yield ndjson_frame({"type": "text", "text": text})
+        except asyncio.TimeoutError:
+            agent_registry.update_metrics_at(slot, success=False)
+            yield ndjson_frame({
+                "type": "error",
+                "detail": f"Request exceeded {REQUEST_TIMEOUT} second timeout"
+            })
+            return
+        except SessionNotFoundError:
+            # The caller's session expired or never existed; not an agent failure
+            yield ndjson_frame({"type": "error", "status": 404, "detail": SESSION_EXPIRED_DETAIL})
+            return
+        except Exception as e:
+            agent_registry.update_metrics_at(slot, success=False)
+            logger.error(
+                "invoke_agent_stream.error - request_id=%s agent_id=%s error=%s",
+                request_id, request.agent_id, e,
+                exc_info=True
+            )
+            yield ndjson_frame({"type": "error", "detail": "An unexpected error occurred"})
+            return
+        
+        agent_registry.update_metrics_at(slot, success=True, tokens=token_count)
+        logger.info(
+            "invoke_agent_stream.success - request_id=%s agent_id=%s tokens=%d",
+            request_id, request.agent_id, token_count
+        )
+        yield ndjson_frame({"type": "end", "tokens": token_count})
+    
+    return NDJSONStreamingResponse(frames())
+
 @app.get("/health")
 async def health_check():
     """Health check with system-wide metrics."""
-    agents = agent_registry.list_agents()
+    agent_ids = agent_registry.agent_ids
+    totals = agent_registry.system_totals()
     
-    total_requests = sum(
-        agent["metrics"]["total_requests"] 
-        for agent in agents.values()
-    )
-    total_successful = sum(
-        agent["metrics"]["successful_requests"] 
-        for agent in agents.values()
-    )
+    total_requests = totals["total_requests"]
+    total_successful = totals["successful_requests"]
     
     return {
         "status": "healthy",
         "service": "enterprise-multi-agent-api",
         "environment": settings.environment,
-        "total_agents": len(agents),
+        "total_agents": len(agent_ids),
         "system_metrics": {
             "total_requests": total_requests,
             "successful_requests": total_successful,
             "success_rate": total_successful / max(total_requests, 1) if total_requests > 0 else 0
         },
-        "agents": list(agents.keys())
+        "agents": agent_ids
     }
 
 # ============================================================================
@@ -495,5 +1014,9 @@ if __name__ == "__main__":
         host=settings.host,
         port=settings.port,
         reload=True,
+        # uvloop and httptools come with uvicorn[standard]; uvloop has no
+        # Windows build, so the stdlib loop is used there
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info"
     )
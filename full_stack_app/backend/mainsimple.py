@@ -16,9 +16,9 @@ This implements production best practices:
 import asyncio
 import logging
 import os
-import uuid
+import sys
+import time
 from contextlib import asynccontextmanager
-from datetime import datetime
 from enum import Enum
 from typing import Optional
 
@@ -26,15 +26,16 @@ import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
-from google.genai import types
 
 from agent import weather_agent
+from generation import agent_text, install_generation_callback, use_generation_config, user_message
+from responses import ModelResponse, ORJSONResponse
 
 # Load environment variables
 load_dotenv()
@@ -91,6 +92,11 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+# Read by every invocation, so hoisted out of the settings model. Settings
+# are fixed at startup, and a module global is the cheapest lookup there is.
+REQUEST_TIMEOUT = settings.request_timeout
+MAX_QUERY_LENGTH = settings.max_query_length
+
 # ============================================================================
 # LOGGING CONFIGURATION
 # ============================================================================
@@ -140,8 +146,8 @@ def validate_configuration() -> None:
     # Set Gemini environment
     os.environ['GOOGLE_GENAI_USE_VERTEXAI'] = str(settings.use_vertexai).lower()
     
-    logger.info(f"Configuration validated. Environment: {settings.environment}")
-    logger.info(f"Allowed origins: {settings.get_allowed_origins()}")
+    logger.info("Configuration validated. Environment: %s", settings.environment)
+    logger.info("Allowed origins: %s", settings.get_allowed_origins())
 
 # ============================================================================
 # LIFESPAN EVENTS
@@ -153,13 +159,13 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Weather Assistant API starting up...")
     validate_configuration()
-    logger.info(f"Agent: {weather_agent.name}")
-    logger.info(f"Model: {weather_agent.model}")
+    logger.info("Agent: %s", weather_agent.name)
+    logger.info("Model: %s", weather_agent.model)
     
     # Check for API key
     weather_api_key = os.getenv("OPENWEATHER_API_KEY")
     if weather_api_key:
-        logger.info(f"✅ OpenWeather API Key configured")
+        logger.info("✅ OpenWeather API Key configured")
     else:
         logger.warning("⚠️  Warning: OPENWEATHER_API_KEY not set!")
     
@@ -176,11 +182,13 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Production-ready Weather Assistant API with full monitoring and security",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
 # CORS configuration with restricted origins
-cors_origins = settings.get_allowed_origins()
+# Starlette only tests membership, so a set makes each check O(1)
+cors_origins = frozenset(settings.get_allowed_origins())
 
 app.add_middleware(
     CORSMiddleware,
@@ -197,6 +205,9 @@ runner = Runner(
     agent=weather_agent,
     session_service=session_service
 )
+# Per-request temperature/max tokens are applied by this callback rather
+# than by mutating the shared agent's config
+install_generation_callback(weather_agent)
 
 # ============================================================================
 # METRICS TRACKING
@@ -208,12 +219,37 @@ class HealthStatus(str, Enum):
     DEGRADED = "degraded"
     UNHEALTHY = "unhealthy"
 
-# Metrics
-service_start_time = datetime.now()
-request_count = 0
-successful_requests = 0
-error_count = 0
-timeout_count = 0
+class ServiceMetrics:
+    """
+    Process-wide request counters.
+    
+    Handlers all run on the one event loop and never await between reading
+    and bumping a counter, so plain ints need no locking, and keeping them on
+    an instance spares the handlers a global statement.
+    """
+    
+    def __init__(self):
+        self.request_count = 0
+        self.successful_requests = 0
+        self.error_count = 0
+        self.timeout_count = 0
+    
+    def record_request(self):
+        self.request_count += 1
+    
+    def record_success(self):
+        self.successful_requests += 1
+    
+    def record_error(self):
+        self.error_count += 1
+    
+    def record_timeout(self):
+        self.timeout_count += 1
+
+# Metrics. Uptime is measured on the monotonic clock, which is cheap to read
+# from the frequently polled /health and unaffected by wall-clock changes.
+service_start_time = time.monotonic()
+metrics = ServiceMetrics()
 
 # ============================================================================
 # REQUEST/RESPONSE MODELS
@@ -221,6 +257,8 @@ timeout_count = 0
 
 class QueryRequest(BaseModel):
     """Request model for agent invocation with validation."""
+    model_config = ConfigDict(frozen=True)
+    
     query: str = Field(
         ...,
         min_length=1,
@@ -242,6 +280,8 @@ class QueryRequest(BaseModel):
 
 class QueryResponse(BaseModel):
     """Response model for agent invocation."""
+    model_config = ConfigDict(frozen=True)
+    
     response: str = Field(..., description="Agent response text")
     model: str = Field(..., description="Model used")
     tokens: int = Field(..., description="Token count estimate")
@@ -275,19 +315,22 @@ async def verify_api_key(authorization: Optional[str] = None) -> None:
 # ENDPOINTS
 # ============================================================================
 
+# The root payload only depends on settings, so it is rendered once
+ROOT_RESPONSE_BODY = ORJSONResponse({
+    "message": settings.app_name,
+    "version": settings.app_version,
+    "environment": settings.environment,
+    "endpoints": {
+        "health": "/health",
+        "invoke": "/invoke (POST)",
+        "docs": "/docs"
+    }
+}).body
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
-    return {
-        "message": settings.app_name,
-        "version": settings.app_version,
-        "environment": settings.environment,
-        "endpoints": {
-            "health": "/health",
-            "invoke": "/invoke (POST)",
-            "docs": "/docs"
-        }
-    }
+    return Response(ROOT_RESPONSE_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
@@ -299,11 +342,11 @@ async def health_check():
         - degraded (200): Service working but with issues
         - unhealthy (503): Service unavailable
     """
-    uptime = (datetime.now() - service_start_time).total_seconds()
-    error_rate = error_count / max(request_count, 1)
+    uptime = time.monotonic() - service_start_time
+    error_rate = metrics.error_count / max(metrics.request_count, 1)
     
     # Determine health status
-    if request_count == 0:
+    if metrics.request_count == 0:
         health_status = HealthStatus.HEALTHY
     elif error_rate > 0.1:  # More than 10% error rate
         health_status = HealthStatus.UNHEALTHY
@@ -317,22 +360,22 @@ async def health_check():
         "service": "weather-assistant-api",
         "environment": settings.environment,
         "uptime_seconds": uptime,
-        "request_count": request_count,
-        "error_count": error_count,
+        "request_count": metrics.request_count,
+        "error_count": metrics.error_count,
         "agent": {
             "name": weather_agent.name,
             "model": weather_agent.model
         },
         "metrics": {
-            "successful_requests": successful_requests,
-            "timeout_count": timeout_count,
+            "successful_requests": metrics.successful_requests,
+            "timeout_count": metrics.timeout_count,
             "error_rate": round(error_rate, 3)
         }
     }
     
     # Return appropriate status code
     if health_status == HealthStatus.UNHEALTHY:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content=response_data
         )
@@ -369,14 +412,12 @@ async def invoke_agent(
     Raises:
         HTTPException: For invalid requests or server errors
     """
-    global request_count, successful_requests, error_count, timeout_count
-    
-    request_id = str(uuid.uuid4())
-    request_count += 1
+    request_id = os.urandom(16).hex()  # Opaque 128-bit ID, no UUID object
+    metrics.record_request()
     
     logger.info(
-        f"invoke_agent.start - request_id={request_id} "
-        f"query_len={len(request.query)}"
+        "invoke_agent.start - request_id=%s query_len=%d",
+        request_id, len(request.query)
     )
     
     try:
@@ -384,14 +425,14 @@ async def invoke_agent(
         await verify_api_key(authorization)
         
         # Validate query length
-        if len(request.query) > settings.max_query_length:
+        if len(request.query) > MAX_QUERY_LENGTH:
             logger.warning(
-                f"invoke_agent.query_too_long - request_id={request_id} "
-                f"len={len(request.query)}"
+                "invoke_agent.query_too_long - request_id=%s len=%d",
+                request_id, len(request.query)
             )
             raise HTTPException(
                 status_code=400,
-                detail=f"Query exceeds maximum length of {settings.max_query_length}"
+                detail=f"Query exceeds maximum length of {MAX_QUERY_LENGTH}"
             )
         
         # Create a session for this invocation
@@ -400,71 +441,67 @@ async def invoke_agent(
             user_id="api_user"
         )
         
-        # Update agent config
-        weather_agent.generate_content_config = types.GenerateContentConfig(
-            temperature=request.temperature,
-            max_output_tokens=request.max_tokens
-        )
+        # Apply this request's generation settings
+        use_generation_config(request.temperature, request.max_tokens)
         
         # Create message content
-        new_message = types.Content(
-            role="user",
-            parts=[types.Part(text=request.query)]
-        )
+        new_message = user_message(request.query)
         
-        # Run agent with timeout
-        response_text = ""
+        # Run agent with timeout; text chunks are joined once at the end
+        chunks = []
+        token_count = 0  # Word count as a token estimate, summed per chunk
         try:
-            async with asyncio.timeout(settings.request_timeout):
-                async for event in runner.run_async(
-                    user_id="api_user",
-                    session_id=session.id,
-                    new_message=new_message
-                ):
-                    if event.content and event.content.parts:
-                        text = event.content.parts[0].text
-                        if text:  # Only concatenate if text is not None
-                            response_text += text
+            async with asyncio.timeout(REQUEST_TIMEOUT):
+                async for text in agent_text(runner, session.id, new_message):
+                    chunks.append(text)
+                    token_count += len(text.split())
         except asyncio.TimeoutError:
-            timeout_count += 1
+            metrics.record_timeout()
             logger.error(
-                f"invoke_agent.timeout - request_id={request_id} "
-                f"timeout={settings.request_timeout}s"
+                "invoke_agent.timeout - request_id=%s timeout=%ss",
+                request_id, REQUEST_TIMEOUT
             )
             raise HTTPException(
                 status_code=504,
-                detail=f"Agent request exceeded {settings.request_timeout} second timeout"
+                detail=f"Agent request exceeded {REQUEST_TIMEOUT} second timeout"
+            )
+        finally:
+            # The session is never handed to the client, so drop it once the
+            # run is over instead of keeping it in memory forever
+            await session_service.delete_session(
+                app_name="weather_assistant_app",
+                user_id="api_user",
+                session_id=session.id
             )
         
-        # Estimate tokens (word count as fallback)
-        token_count = len(response_text.split())
+        response_text = "".join(chunks)
         
-        successful_requests += 1
+        metrics.record_success()
         logger.info(
-            f"invoke_agent.success - request_id={request_id} "
-            f"tokens={token_count}"
+            "invoke_agent.success - request_id=%s tokens=%d",
+            request_id, token_count
         )
         
-        return QueryResponse(
+        return ModelResponse(QueryResponse(
             response=response_text,
             model=weather_agent.model,
             tokens=token_count,
             request_id=request_id
-        )
+        ))
         
     except HTTPException as e:
-        error_count += 1
+        metrics.record_error()
         logger.warning(
-            f"invoke_agent.http_error - request_id={request_id} "
-            f"status={e.status_code}"
+            "invoke_agent.http_error - request_id=%s status=%s",
+            request_id, e.status_code
         )
         raise
     
     except ValueError as e:
-        error_count += 1
+        metrics.record_error()
         logger.warning(
-            f"invoke_agent.validation_error - request_id={request_id} "
-            f"error={str(e)}"
+            "invoke_agent.validation_error - request_id=%s error=%s",
+            request_id, e
         )
         raise HTTPException(
             status_code=400,
@@ -472,10 +509,10 @@ async def invoke_agent(
         )
     
     except Exception as e:
-        error_count += 1
+        metrics.record_error()
         logger.error(
-            f"invoke_agent.unexpected_error - request_id={request_id} "
-            f"error_type={type(e).__name__} error={str(e)}",
+            "invoke_agent.unexpected_error - request_id=%s error_type=%s error=%s",
+            request_id, type(e).__name__, e,
             exc_info=True
         )
         # Don't expose internal error details
@@ -484,21 +521,22 @@ async def invoke_agent(
             detail="An unexpected error occurred. Please try again later."
         )
 
-@app.middleware("http")
-async def track_requests(request, call_next):
-    """Middleware to track requests and errors."""
-    response = await call_next(request)
-    return response
-
 # ============================================================================
 # MAIN
 # ============================================================================
 
 if __name__ == "__main__":
+    # Reload only makes sense in development and cannot run multiple workers
+    development = settings.environment == "development"
     uvicorn.run(
-        "main:app",
+        "mainsimple:app",
         host=settings.host,
         port=settings.port,
-        reload=True,
+        reload=development,
+        workers=1 if development else settings.workers,
+        # uvloop and httptools come with uvicorn[standard]; uvloop has no
+        # Windows build, so the stdlib loop is used there
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -0,0 +1,49 @@
+"""
+Shared response classes for the backend APIs.
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson's C encoder instead of stdlib json.
+
+    Defined locally because newer FastAPI releases deprecate their own
+    ORJSONResponse, while the versions this backend supports still use the
+    stdlib encoder for plain dict responses.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ModelResponse(Response):
+    """
+    Response for an already-validated Pydantic model.
+
+    Returning a model from a response_model endpoint makes FastAPI validate it
+    again and dump it to a dict before encoding. This serializes the model to
+    JSON bytes in pydantic-core in one step; the endpoint keeps its
+    response_model for the OpenAPI docs.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.__pydantic_serializer__.to_json(content)
+
+
+def ndjson_frame(content: Any) -> bytes:
+    """Encode one newline-delimited JSON frame."""
+    return orjson.dumps(content, option=orjson.OPT_APPEND_NEWLINE)
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """StreamingResponse for an iterator of ndjson_frame() chunks."""
+
+    media_type = "application/x-ndjson"
@@ -1,5 +1,11 @@
 """GitHub Review Agent - Code review assistant using GitHub API"""
 
-from .agent import root_agent
-
 __all__ = ["root_agent"]
+
+
+def __getattr__(name: str):
+    # Defer building the agent until ADK (or a caller) asks for it
+    if name == "root_agent":
+        from .agent import root_agent
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,31 @@
 # Required by ADK for proper Python type hints
 from __future__ import annotations
 
+import functools
+
 # Import the Agent class
 from google.adk.agents import Agent
 
-# Define your agent - MUST be named 'root_agent'
-root_agent = Agent(
-    name="hello_assistant",
-    model="gemini-2.0-flash",
-    description="A friendly AI assistant for general conversation",
-    instruction=(
-        "You are a warm and helpful assistant. "
-        "Greet users enthusiastically and answer their questions clearly. "
-        "Be conversational and friendly!"
+
+# Define your agent - ADK looks it up as 'root_agent'
+@functools.cache
+def build_agent() -> Agent:
+    """Build the hello agent."""
+    return Agent(
+        name="hello_assistant",
+        model="gemini-2.0-flash",
+        description="A friendly AI assistant for general conversation",
+        instruction=(
+            "You are a warm and helpful assistant. "
+            "Greet users enthusiastically and answer their questions clearly. "
+            "Be conversational and friendly!"
+        )
     )
-)
\ No newline at end of file
+
+
+# 'root_agent' is built on first access, so importing this module doesn't
+# construct an Agent for a process that serves a different one
+def __getattr__(name: str):
+    if name == "root_agent":
+        return build_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,11 +5,39 @@ This agent demonstrates how to use OpenAPIToolset to interact with the
 Jira API for issue retrieval and management tasks without writing custom tool functions.
 """
 
+from google.adk import __version__ as adk_version
 from google.adk.agents import Agent
-from google.adk.tools.openapi_tool import OpenAPIToolset
-from google.adk.tools.openapi_tool.auth.auth_helpers import token_to_scheme_credential
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.openapi_tool.openapi_spec_parser import OpenApiSpecParser, RestApiTool
+from google.adk.tools.tool_context import ToolContext
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
 import os
 import base64
+import pickle
+import time
+from contextvars import ContextVar, Token
+from pathlib import Path
+from types import MappingProxyType
+from typing import Optional
+
+import httpx
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+try:
+    from openapi_spec_validator import validate as validate_openapi_spec
+except ImportError:
+    validate_openapi_spec = None
+
+logger = logging.getLogger(__name__)
 
 # ============================================================================
 # OPENAPI SPECIFICATION
@@ -17,689 +45,577 @@ import base64
 
 # Jira API OpenAPI Specification (subset for issue management)
 # Based on: https://developer.atlassian.com/cloud/jira/platform/rest/v3/
-JIRA_API_SPEC = {
-    "openapi": "3.0.0",
-    "info": {
-        "title": "Jira API",
-        "description": "Jira REST API for issue retrieval and management operations",
-        "version": "3.0.0"
-    },
-    "servers": [
-        {
-            "url": "https://{domain}",
-            "variables": {
-                "domain": {
-                    "default": "your-domain.atlassian.net",
-                    "description": "Your Jira domain"
-                }
-            }
-        }
-    ],
-    "components": {
-        "securitySchemes": {
-            "basicAuth": {
-                "type": "http",
-                "scheme": "basic",
-                "description": "Basic authentication with email and API token"
-            }
-        }
-    },
-    "security": [
-        {
-            "basicAuth": []
-        }
-    ],
-    "paths": {
-        "/rest/api/3/project": {
-            "get": {
-                "operationId": "list_projects",
-                "summary": "List all projects",
-                "description": "Returns a list of projects visible to the user.",
-                "parameters": [
-                    {
-                        "name": "recent",
-                        "in": "query",
-                        "description": "Return projects recently accessed by the user",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 0
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "id": {"type": "string"},
-                                            "key": {"type": "string"},
-                                            "name": {"type": "string"},
-                                            "projectTypeKey": {"type": "string"},
-                                            "simplified": {"type": "boolean"},
-                                            "style": {"type": "string"},
-                                            "isPrivate": {"type": "boolean"}
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/rest/api/3/search/jql": {
-            "get": {
-                "operationId": "search_issues",
-                "summary": "Search for issues using JQL",
-                "description": "Searches for issues using JQL (Jira Query Language).",
-                "parameters": [
-                    {
-                        "name": "jql",
-                        "in": "query",
-                        "description": "JQL query string",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "startAt",
-                        "in": "query",
-                        "description": "The index of the first item to return",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 0
-                        }
-                    },
-                    {
-                        "name": "maxResults",
-                        "in": "query",
-                        "description": "The maximum number of items to return",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 50
-                        }
-                    },
-                    {
-                        "name": "fields",
-                        "in": "query",
-                        "description": "A comma-separated list of fields to return",
-                        "required": False,
-                        "schema": {
-                            "type": "string",
-                            "default": "summary,status,assignee,priority,issuetype"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "startAt": {"type": "integer"},
-                                        "maxResults": {"type": "integer"},
-                                        "total": {"type": "integer"},
-                                        "issues": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "string"},
-                                                    "key": {"type": "string"},
-                                                    "fields": {"type": "object"}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            "post": {
-                "operationId": "search_issues_post",
-                "summary": "Search for issues using JQL (POST)",
-                "description": "Searches for issues using JQL with POST request (for complex queries).",
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "jql": {
-                                        "type": "string",
-                                        "description": "JQL query string"
-                                    },
-                                    "startAt": {
-                                        "type": "integer",
-                                        "description": "The index of the first item to return",
-                                        "default": 0
-                                    },
-                                    "maxResults": {
-                                        "type": "integer",
-                                        "description": "The maximum number of items to return",
-                                        "default": 50
-                                    },
-                                    "fields": {
-                                        "type": "array",
-                                        "description": "List of fields to return",
-                                        "items": {
-                                            "type": "string"
-                                        },
-                                        "default": ["summary", "status", "assignee", "priority", "issuetype"]
-                                    }
-                                },
-                                "required": ["jql"]
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "startAt": {"type": "integer"},
-                                        "maxResults": {"type": "integer"},
-                                        "total": {"type": "integer"},
-                                        "issues": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "string"},
-                                                    "key": {"type": "string"},
-                                                    "fields": {"type": "object"}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/rest/api/3/issue/{issueIdOrKey}": {
-            "get": {
-                "operationId": "get_issue",
-                "summary": "Get issue details",
-                "description": "Returns the details of an issue.",
-                "parameters": [
-                    {
-                        "name": "issueIdOrKey",
-                        "in": "path",
-                        "description": "The ID or key of the issue",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "fields",
-                        "in": "query",
-                        "description": "A comma-separated list of fields to return",
-                        "required": False,
-                        "schema": {
-                            "type": "string",
-                            "default": "*all"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "string"},
-                                        "key": {"type": "string"},
-                                        "fields": {"type": "object"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/rest/api/3/issue": {
-            "post": {
-                "operationId": "create_issue",
-                "summary": "Create issue",
-                "description": "Creates an issue or a sub-task.",
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "fields": {
-                                        "type": "object",
-                                        "properties": {
-                                            "project": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "key": {"type": "string"}
-                                                }
-                                            },
-                                            "summary": {"type": "string"},
-                                            "description": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "type": {"type": "string", "default": "doc"},
-                                                    "version": {"type": "integer", "default": 1},
-                                                    "content": {
-                                                        "type": "array",
-                                                        "items": {
-                                                            "type": "object"
-                                                        }
-                                                    }
-                                                }
-                                            },
-                                            "issuetype": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "name": {"type": "string"}
-                                                }
-                                            },
-                                            "priority": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "name": {"type": "string"}
-                                                }
-                                            }
-                                        },
-                                        "required": ["project", "summary", "issuetype"]
-                                    }
-                                }
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "201": {
-                        "description": "Issue created successfully",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "string"},
-                                        "key": {"type": "string"},
-                                        "self": {"type": "string"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/rest/api/3/issue/{issueIdOrKey}/comment": {
-            "get": {
-                "operationId": "get_comments",
-                "summary": "Get comments",
-                "description": "Returns all comments for an issue.",
-                "parameters": [
-                    {
-                        "name": "issueIdOrKey",
-                        "in": "path",
-                        "description": "The ID or key of the issue",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    },
-                    {
-                        "name": "startAt",
-                        "in": "query",
-                        "description": "The index of the first item to return",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 0
-                        }
-                    },
-                    {
-                        "name": "maxResults",
-                        "in": "query",
-                        "description": "The maximum number of items to return",
-                        "required": False,
-                        "schema": {
-                            "type": "integer",
-                            "default": 50
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "startAt": {"type": "integer"},
-                                        "maxResults": {"type": "integer"},
-                                        "total": {"type": "integer"},
-                                        "comments": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "string"},
-                                                    "author": {"type": "object"},
-                                                    "body": {"type": "object"},
-                                                    "created": {"type": "string"}
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            "post": {
-                "operationId": "add_comment",
-                "summary": "Add comment",
-                "description": "Adds a comment to an issue.",
-                "parameters": [
-                    {
-                        "name": "issueIdOrKey",
-                        "in": "path",
-                        "description": "The ID or key of the issue",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    }
-                ],
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "body": {
-                                        "type": "object",
-                                        "properties": {
-                                            "type": {"type": "string", "default": "doc"},
-                                            "version": {"type": "integer", "default": 1},
-                                            "content": {
-                                                "type": "array",
-                                                "items": {
-                                                    "type": "object",
-                                                    "properties": {
-                                                        "type": {"type": "string", "default": "paragraph"},
-                                                        "content": {
-                                                            "type": "array",
-                                                            "items": {
-                                                                "type": "object",
-                                                                "properties": {
-                                                                    "type": {"type": "string", "default": "text"},
-                                                                    "text": {"type": "string"}
-                                                                }
-                                                            }
-                                                        }
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "201": {
-                        "description": "Comment added successfully",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "id": {"type": "string"},
-                                        "self": {"type": "string"}
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        },
-        "/rest/api/3/issue/{issueIdOrKey}/transitions": {
-            "get": {
-                "operationId": "get_transitions",
-                "summary": "Get transitions",
-                "description": "Returns the transitions available for an issue.",
-                "parameters": [
-                    {
-                        "name": "issueIdOrKey",
-                        "in": "path",
-                        "description": "The ID or key of the issue",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    }
-                ],
-                "responses": {
-                    "200": {
-                        "description": "Successful response",
-                        "content": {
-                            "application/json": {
-                                "schema": {
-                                    "type": "object",
-                                    "properties": {
-                                        "transitions": {
-                                            "type": "array",
-                                            "items": {
-                                                "type": "object",
-                                                "properties": {
-                                                    "id": {"type": "string"},
-                                                    "name": {"type": "string"},
-                                                    "to": {
-                                                        "type": "object",
-                                                        "properties": {
-                                                            "id": {"type": "string"},
-                                                            "name": {"type": "string"}
-                                                        }
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            "post": {
-                "operationId": "do_transition",
-                "summary": "Perform transition",
-                "description": "Performs an issue transition.",
-                "parameters": [
-                    {
-                        "name": "issueIdOrKey",
-                        "in": "path",
-                        "description": "The ID or key of the issue",
-                        "required": True,
-                        "schema": {
-                            "type": "string"
-                        }
-                    }
-                ],
-                "requestBody": {
-                    "required": True,
-                    "content": {
-                        "application/json": {
-                            "schema": {
-                                "type": "object",
-                                "properties": {
-                                    "transition": {
-                                        "type": "object",
-                                        "properties": {
-                                            "id": {"type": "string"}
-                                        }
-                                    }
-                                },
-                                "required": ["transition"]
-                            }
-                        }
-                    }
-                },
-                "responses": {
-                    "204": {
-                        "description": "Transition performed successfully"
-                    }
-                }
-            }
-        }
-    }
-}
+# The spec lives in jira_api_spec.json next to this module and is parsed once
+# at import. orjson's C parser is used when it is installed; the stdlib json
+# module produces the same dict otherwise. The shared spec is read-only at the
+# top level; the toolset builds its own copy with the domain filled in. The
+# spec declares the basic scheme but requires none: the shared HTTP client
+# sends the credentials, so ADK's per-call auth handling is skipped.
+JIRA_API_SPEC_PATH = Path(__file__).with_name("jira_api_spec.json")
+JIRA_API_SPEC = MappingProxyType(_json.loads(JIRA_API_SPEC_PATH.read_bytes()))
 
 # ============================================================================
 # OPENAPI TOOLSET WITH AUTHENTICATION
 # ============================================================================
 
-# Get Jira credentials from environment
-jira_email = os.getenv("JIRA_EMAIL")
-jira_api_token = os.getenv("JIRA_API_TOKEN")
-jira_domain = os.getenv("JIRA_DOMAIN")
-
-if not jira_email or not jira_api_token or not jira_domain:
-    print("WARNING: Jira credentials not found in environment variables.")
-    print("Please set JIRA_EMAIL, JIRA_API_TOKEN, and JIRA_DOMAIN in your .env file to use this agent.")
-    jira_email = "your_email@example.com"
-    jira_api_token = "your_api_token"
-    jira_domain = "your-domain.atlassian.net"
-
-# Create Basic Auth credentials (email:api_token)
-auth_credentials = base64.b64encode(f"{jira_email}:{jira_api_token}".encode()).decode()
-
-# Create authentication scheme and credential using helper function
-auth_scheme, auth_credential = token_to_scheme_credential(
-    "apikey",                    # Type: use "apikey" for header-based auth
-    "header",                    # Location: token goes in header
-    "Authorization",             # Key name: the header name
-    f"Basic {auth_credentials}"  # Key value: Basic auth with base64 encoded credentials
+# Build the toolset (the credentials are sent by the shared client, see below)
+#
+# RestApiTool decodes every response with response.json(), which httpx runs
+# through stdlib json. Search pages and ADF comment bodies are the largest
+# payloads this agent handles, so the tools' client hands back responses that
+# decode with orjson instead, when it is installed.
+class _OrjsonResponse(httpx.Response):
+    """Response whose json() uses the module's JSON parser."""
+
+    def json(self, **kwargs):
+        return _json.loads(self.content)
+
+
+class _OrjsonTransport(httpx.AsyncBaseTransport):
+    """Wrap a transport so its responses decode JSON with orjson."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        return _OrjsonResponse(
+            response.status_code,
+            headers=response.headers,
+            stream=response.stream,
+            extensions=response.extensions
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# One connection pool shared by every Jira tool call, so TLS handshakes with
+# the Jira site are paid once rather than per call. With h2 installed the pool
+# speaks HTTP/2, so parallel tool calls multiplex over a single connection.
+# RestApiTool closes the client returned by httpx_client_factory
+# after each call, so the client wraps the shared pool in a transport whose
+# close is a no-op.
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Delegate to a long-lived transport without closing it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+# Jira Cloud answers requests over its rate limit with 429 and says when to
+# come back: Retry-After, or the refill interval and rate of its token bucket.
+# Retrying straight away only extends the penalty, so a 429 pauses every call
+# on the shared pool until then, and the call is retried up to MAX_RETRIES
+# times, backing off exponentially when Jira gives no hint.
+MAX_RETRIES = 5
+MAX_RETRY_DELAY = 60.0
+
+
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a rate-limited request."""
+    headers = response.headers
+    try:
+        delay = float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        try:
+            delay = float(headers["X-RateLimit-Interval-Seconds"]) / float(
+                headers["X-RateLimit-FillRate"]
+            )
+        except (KeyError, ValueError, ZeroDivisionError):
+            delay = 2.0 ** attempt
+    return min(max(delay, 0.0), MAX_RETRY_DELAY)
+
+
+class _RateLimitTransport(httpx.AsyncBaseTransport):
+    """Retry 429 responses, holding back all calls while Jira is throttling."""
+
+    # Shared by every client, since they all draw on the same rate limit
+    paused_until = 0.0
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(MAX_RETRIES + 1):
+            wait = _RateLimitTransport.paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            response = await self._transport.handle_async_request(request)
+            if response.status_code != 429 or attempt == MAX_RETRIES:
+                return response
+            await response.aclose()
+            _RateLimitTransport.paused_until = max(
+                _RateLimitTransport.paused_until,
+                time.monotonic() + retry_delay(response, attempt)
+            )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+@functools.cache
+def jira_http_transport() -> httpx.AsyncHTTPTransport:
+    """The shared pool, created on first use since its SSL setup is slow."""
+    return httpx.AsyncHTTPTransport(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=32,
+            max_keepalive_connections=16,
+            keepalive_expiry=75.0
+        ),
+    )
+
+
+def basic_auth_value(email: str, api_token: str) -> str:
+    """Authorization header value for a Jira email and API token."""
+    # Basic Auth credentials (email:api_token), joined as bytes
+    credentials = base64.b64encode(
+        email.encode() + b":" + api_token.encode()
+    ).decode("ascii")
+    return f"Basic {credentials}"
+
+
+@functools.cache
+def jira_settings() -> tuple[str, str, str]:
+    """The Jira email, API token and domain from the environment, read once."""
+    # Get Jira credentials from environment
+    jira_email = os.getenv("JIRA_EMAIL")
+    jira_api_token = os.getenv("JIRA_API_TOKEN")
+    jira_domain = os.getenv("JIRA_DOMAIN")
+
+    if not jira_email or not jira_api_token or not jira_domain:
+        logger.warning(
+            "Jira credentials not found in environment variables. Please set "
+            "JIRA_EMAIL, JIRA_API_TOKEN, and JIRA_DOMAIN in your .env file to use this agent."
+        )
+        jira_email = "your_email@example.com"
+        jira_api_token = "your_api_token"
+        jira_domain = "your-domain.atlassian.net"
+
+    return jira_email, jira_api_token, jira_domain
+
+
+@functools.cache
+def jira_auth_headers() -> dict:
+    """Authorization header for the environment's credentials, built once."""
+    jira_email, jira_api_token, _ = jira_settings()
+    return {"Authorization": basic_auth_value(jira_email, jira_api_token)}
+
+
+# One process can serve several Jira users of the same site with a single
+# parsed toolset: a caller that sets jira_request_auth (see
+# use_jira_credentials) before running the agent has that request's tool calls
+# sent with those credentials instead of the ones from the environment. Tasks
+# started while handling the request inherit the value, so parallel tool calls
+# keep it.
+jira_request_auth: ContextVar[Optional[str]] = ContextVar(
+    "jira_request_auth", default=None
 )
 
-# Update the server URL with the actual domain
-JIRA_API_SPEC["servers"][0]["url"] = f"https://{jira_domain}"
 
-# Create OpenAPIToolset with authentication
-jira_toolset = OpenAPIToolset(
-    spec_dict=JIRA_API_SPEC,
-    auth_scheme=auth_scheme,
-    auth_credential=auth_credential
+def use_jira_credentials(email: str, api_token: str) -> Token:
+    """
+    Send the current context's Jira calls with these credentials.
+
+    Returns the token for jira_request_auth.reset(), to restore the previous
+    credentials once the request is done.
+    """
+    return jira_request_auth.set(basic_auth_value(email, api_token))
+
+
+async def _apply_request_auth(request: httpx.Request) -> None:
+    """Swap in the current request's credentials, if a caller set any."""
+    auth = jira_request_auth.get()
+    if auth is not None:
+        request.headers["Authorization"] = auth
+
+
+def jira_http_client() -> httpx.AsyncClient:
+    """Client factory for the Jira tools, backed by the shared pool."""
+    # The credentials are static, so they are sent as a default header on
+    # every client rather than configured as an ADK auth scheme that each tool
+    # call resolves again
+    return httpx.AsyncClient(
+        transport=_OrjsonTransport(
+            _RateLimitTransport(_SharedTransport(jira_http_transport()))
+        ),
+        headers=jira_auth_headers(),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        event_hooks={"request": [_apply_request_auth]},
+    )
+
+
+async def warm_up_jira_connections() -> None:
+    """Open a pooled connection to the Jira site ahead of the first tool call."""
+    _, _, jira_domain = jira_settings()
+    async with jira_http_client() as client:
+        await client.head(f"https://{jira_domain}/rest/api/3/serverInfo")
+
+
+async def close_jira_connections() -> None:
+    """Close the shared pool, if any tool call opened it."""
+    if jira_http_transport.cache_info().currsize:
+        await jira_http_transport().aclose()
+        jira_http_transport.cache_clear()
+
+
+# Parsing the spec into tools runs on every process start. The parsed tools are
+# pickled into this directory, keyed by a hash of the spec (including the
+# domain), the ADK version and this module's name (the tools refer to its
+# client factory), so later starts load them instead of parsing again. The
+# tools hold no credentials; the API token is added by the client factory, so
+# it is never written to disk.
+TOOLSET_CACHE_DIR = Path(
+    os.getenv("ADK_TOOLSET_CACHE_DIR", Path.home() / ".cache" / "adk")
 )
 
+
+def private_cache_dir() -> Optional[Path]:
+    """Return TOOLSET_CACHE_DIR, created 0700, if only this user can write it.
+
+    Anyone who can plant a file in the directory gets code run in this process
+    when the file is unpickled, so a directory owned by another user, or
+    writable by group or others, is not used and nothing is cached.
+    """
+    try:
+        TOOLSET_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = TOOLSET_CACHE_DIR.stat()
+    except OSError:
+        return None  # Caching is best-effort; a read-only home still works
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o022):
+        logger.warning("Not using %s, others can write to it", TOOLSET_CACHE_DIR)
+        return None
+    return TOOLSET_CACHE_DIR
+
+
+def load_jira_tools(spec: dict) -> list:
+    """Return the tools for a spec, from the cache when possible."""
+    spec_bytes = json.dumps(spec, sort_keys=True).encode()
+    key = hashlib.blake2b(
+        spec_bytes + adk_version.encode() + __name__.encode(), digest_size=16
+    ).hexdigest()
+    cache_dir = private_cache_dir()
+    cache_file = cache_dir / f"jira-tools-{key}.pkl" if cache_dir else None
+
+    if cache_file is not None:
+        try:
+            return pickle.loads(cache_file.read_bytes())
+        except Exception:
+            pass  # Missing or unreadable cache entry: build it below
+
+    # ADK's parser accepts some invalid specs (an undeclared path parameter,
+    # a dangling $ref) and the mistake only shows up when a tool is called.
+    # When openapi-spec-validator is installed the spec is checked here, once
+    # per spec version, since a cached build was already checked.
+    if validate_openapi_spec is not None:
+        validate_openapi_spec(spec)
+
+    tools = [
+        RestApiTool.from_parsed_operation(
+            operation, httpx_client_factory=jira_http_client
+        )
+        for operation in OpenApiSpecParser().parse(spec)
+    ]
+
+    if cache_file is not None:
+        try:
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp_file.write_bytes(pickle.dumps(tools))
+            tmp_file.replace(cache_file)
+        except OSError:
+            pass  # Caching is best-effort; a read-only home still works
+
+    return tools
+
+
+class CachedToolset(BaseToolset):
+    """Toolset serving prebuilt RestApiTools."""
+
+    def __init__(self, tools: list):
+        super().__init__()
+        self._tools = tools
+
+    async def get_tools(self, readonly_context=None) -> list:
+        return [
+            tool
+            for tool in self._tools
+            if self._is_tool_selected(tool, readonly_context)
+        ]
+
+    def get_tool(self, tool_name: str):
+        return next((tool for tool in self._tools if tool.name == tool_name), None)
+
+
+@functools.cache
+def load_jira_toolset() -> CachedToolset:
+    """Build the Jira toolset on first use."""
+    _, _, jira_domain = jira_settings()
+
+    # Point the spec at the actual domain, leaving the shared spec unmodified
+    spec = {**JIRA_API_SPEC, "servers": [{"url": f"https://{jira_domain}"}]}
+
+    return CachedToolset(load_jira_tools(spec))
+
 # ============================================================================
-# AGENT DEFINITION
+# TOOL RESULT SHAPING
+# ============================================================================
+
+# Comment bodies and issue descriptions arrive as Atlassian Document Format
+# trees, often many times the size of their text. Jira can't be asked to leave
+# them out (expand=renderedBody only adds HTML next to the ADF), so the trees
+# are flattened to plain text before the model sees them.
+_ADF_BLOCKS = {
+    "paragraph", "heading", "blockquote", "codeBlock", "listItem", "rule",
+    "tableRow", "panel", "mediaSingle"
+}
+
+
+def _adf_text(node: dict, out: list):
+    """Append the text of an ADF node and its children to out."""
+    kind = node.get("type")
+    if kind == "text":
+        out.append(node.get("text", ""))
+        return
+    if kind == "hardBreak":
+        out.append("\n")
+        return
+    attrs = node.get("attrs") or {}
+    if kind in ("mention", "emoji"):
+        out.append(attrs.get("text") or attrs.get("shortName", ""))
+    elif kind == "inlineCard":
+        out.append(attrs.get("url", ""))
+    elif kind == "listItem":
+        out.append("- ")
+    for child in node.get("content") or ():
+        if isinstance(child, dict):
+            _adf_text(child, out)
+    if kind in _ADF_BLOCKS and out and not out[-1].endswith("\n"):
+        out.append("\n")
+
+
+def adf_to_text(value):
+    """Plain text of an ADF document; anything else is returned unchanged."""
+    if not (isinstance(value, dict) and value.get("type") == "doc"):
+        return value
+    out = []
+    _adf_text(value, out)
+    return "".join(out).strip()
+
+
+def _flatten_description(issue):
+    fields = issue.get("fields") if isinstance(issue, dict) else None
+    if isinstance(fields, dict) and "description" in fields:
+        issue["fields"] = {**fields, "description": adf_to_text(fields["description"])}
+    return issue
+
+
+def _shape_comments(result: dict) -> dict:
+    return {
+        **result,
+        "comments": [
+            {**comment, "body": adf_to_text(comment.get("body"))}
+            if isinstance(comment, dict) else comment
+            for comment in result.get("comments") or ()
+        ]
+    }
+
+
+def _shape_issue(result: dict) -> dict:
+    return _flatten_description(dict(result))
+
+
+def _shape_search(result: dict) -> dict:
+    return {
+        **result,
+        "issues": [
+            _flatten_description(dict(issue)) if isinstance(issue, dict) else issue
+            for issue in result.get("issues") or ()
+        ]
+    }
+
+
+RESULT_SHAPERS = {
+    "get_comments": _shape_comments,
+    "get_issue": _shape_issue,
+    "search_issues": _shape_search,
+    "search_issues_post": _shape_search,
+}
+
+
+def shape_result(tool_name: str, result):
+    """Flatten the ADF in a generated tool's result to plain text."""
+    shaper = RESULT_SHAPERS.get(tool_name)
+    if shaper is None or not isinstance(result, dict) or result.keys() & {"error", "pending", "text"}:
+        return result  # Nothing to flatten, or an error/auth/non-JSON result
+    return shaper(result)
+
+
+def shape_tool_result(tool, args, tool_context, tool_response):
+    """After-tool callback applying shape_result to the generated tools."""
+    if tool.name not in RESULT_SHAPERS:
+        return None  # Other tools' results are passed through as they are
+    return shape_result(tool.name, tool_response)
+
+
+async def run_jira_tool(tool_name: str, args: dict, tool_context: Optional[ToolContext]):
+    """
+    Run a generated tool directly, shaping its result like the callback does.
+
+    tool_context may be None when calling from outside an agent run; the
+    tools' credentials come from the shared client, not the context.
+    """
+    tool = load_jira_toolset().get_tool(tool_name)
+    return shape_result(tool_name, await tool.run_async(args=args, tool_context=tool_context))
+
+# ============================================================================
+# COMPOSITE TOOLS
 # ============================================================================
 
-root_agent = Agent(
-    name="jira_assistant",
-    model="gemini-2.5-flash",
+# Jira's search pages by token: each page carries the nextPageToken for the
+# one after it, so the pages are requested one after another, at the largest
+# page size Jira allows to keep the round trips few. The collected results are
+# capped to keep the model's context sane.
+SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_RESULTS = 1000
+
+
+async def search_all_issues(
+    jql: str,
+    fields: str = "summary,status,assignee,priority,issuetype",
+    *,
+    tool_context: ToolContext
+) -> dict:
+    """
+    Find every issue matching a JQL query, following Jira's result pages.
+
+    Args:
+        jql: JQL query string
+        fields: A comma-separated list of fields to return
+
+    Returns:
+        The matching issues under "issues", and "truncated" set when more
+        than 1,000 issues match.
+    """
+    page_token = None
+    issues = []
+    while True:
+        args = {"jql": jql, "fields": fields, "max_results": SEARCH_PAGE_SIZE}
+        if page_token is not None:
+            args["next_page_token"] = page_token
+        page = await run_jira_tool("search_issues", args, tool_context)
+        if not isinstance(page.get("issues"), list):
+            return page  # Error from the search request
+
+        issues.extend(page["issues"])
+        page_token = None if page.get("isLast", False) else page.get("nextPageToken")
+        if page_token is None or len(issues) >= MAX_SEARCH_RESULTS:
+            break
+
+    return {
+        "issues": issues[:MAX_SEARCH_RESULTS],
+        "truncated": len(issues) > MAX_SEARCH_RESULTS or page_token is not None
+    }
+
+# Syntax reference the model looks up on demand, instead of carrying it in the
+# instruction on every turn.
+JQL_CHEATSHEET = """
+JQL TIPS:
+- Basic format: field operator value
+- Common fields: project, issuetype, status, priority, assignee, reporter, created, updated
+- Common operators: =, !=, >, >=, <, <=, IN, NOT IN, ~ (contains), !~ (does not contain)
+- Examples:
+  - project = "PROJECT-KEY" AND status = "Open"
+  - issuetype = Bug AND priority IN (High, Highest)
+  - assignee = currentUser() AND status != Done
+  - created >= -30d AND project = "PROJECT-KEY"
+
+ISSUE CREATION TIPS:
+- Required fields: project key, summary, issue type
+- Common issue types: Bug, Task, Story, Epic
+- Common priorities: Highest, High, Medium, Low, Lowest
+- Descriptions and comments are Atlassian Document Format, e.g.
+  {"type": "doc", "version": 1, "content": [{"type": "paragraph",
+   "content": [{"type": "text", "text": "..."}]}]}
+"""
+
+
+def get_jql_cheatsheet() -> str:
+    """
+    Get a JQL syntax and issue creation reference.
+
+    Returns:
+        JQL fields, operators and example queries, plus the fields, issue
+        types and priorities used when creating issues.
+    """
+    return JQL_CHEATSHEET
+
+# ============================================================================
+# AGENT DEFINITION
+# ============================================================================
 
-    description="""
+JIRA_AGENT_DESCRIPTION = """
     Jira issue retrieval assistant that can search for issues, view details,
     create new issues, and manage issue workflows using the Jira API.
-    """,
-
-    instruction="""
-    You are an expert Jira assistant for issue management!
-
-    CAPABILITIES:
-    - List projects in the user's Jira instance
-    - Search for issues using JQL (Jira Query Language)
-    - Get detailed information about specific issues
-    - View issue comments
-    - Create new issues
-    - Add comments to issues
-    - Transition issues through workflows
-
-    WORKFLOW FOR DISCOVERING PROJECTS:
-    1. Use list_projects to see available projects
-    2. Use search_issues to find issues in a specific project
-
-    WORKFLOW FOR ISSUE MANAGEMENT:
-    1. Use search_issues to find relevant issues
-    2. Use get_issue to get detailed information about a specific issue
-    3. Use get_comments to view issue comments
-    4. Use add_comment to add comments to an issue
-    5. Use get_transitions to see available workflow transitions
-    6. Use do_transition to move an issue through its workflow
-
-    JQL TIPS:
-    - Basic format: field operator value
-    - Common fields: project, issuetype, status, priority, assignee, reporter, created, updated
-    - Common operators: =, !=, >, >=, <, <=, IN, NOT IN, ~ (contains), !~ (does not contain)
-    - Examples:
-      - project = "PROJECT-KEY" AND status = "Open"
-      - issuetype = Bug AND priority IN (High, Highest)
-      - assignee = currentUser() AND status != Done
-      - created >= -30d AND project = "PROJECT-KEY"
-
-    ISSUE CREATION TIPS:
-    - Required fields: project key, summary, issue type
-    - Common issue types: Bug, Task, Story, Epic
-    - Common priorities: Highest, High, Medium, Low, Lowest
-
-    IMPORTANT NOTES:
-    - Always use proper JQL syntax for searches
-    - Issue keys are in the format PROJECT-123
-    - For complex searches, use search_issues_post instead of search_issues
-    - When creating issues or adding comments, follow the Atlassian Document Format
-    - Be helpful and explain Jira concepts to users who may be unfamiliar
-
-    EXAMPLE INTERACTIONS:
-    - "List all projects in my Jira instance"
-    - "Find all open bugs in the PROJECT-123 project"
-    - "Show me details for issue PROJECT-456"
-    - "Create a new bug in PROJECT-123 with high priority"
-    - "Add a comment to issue PROJECT-789 about the latest update"
-    - "What transitions are available for issue PROJECT-101?"
-    - "Move issue PROJECT-101 to 'In Progress'"
-    
-    PARALLEL EXECUTION:
-    When users ask about multiple issues or operations, execute ALL necessary API calls in parallel to be efficient.
-    For example:
-    - If asked to find issues across multiple projects, call search_issues for EACH project simultaneously
-    - If asked to get details for multiple issues, call get_issue for EACH issue in parallel
-    - If asked to perform operations on multiple issues, execute those operations concurrently
-    
-    This parallel execution makes you much more responsive and efficient when handling batch operations.
-    """,
-
-    # Pass the toolset to the agent
-    tools=[jira_toolset]
-)
+    """
+
+JIRA_INSTRUCTION = """
+    You are an expert Jira assistant for issue management. Issue keys look
+    like PROJECT-123. Call get_jql_cheatsheet before writing a JQL query or
+    creating an issue if you are unsure of the syntax or required fields.
+
+    WORKFLOW:
+    1. list_projects for available projects; search_issues (or
+       search_issues_post for complex queries) to find issues
+    2. get_issue for details; pass
+       fields="summary,status,assignee,priority,issuetype,description"
+       unless the user asks for the full issue, then fields="*all"
+    3. get_comments / add_comment for discussion (comments come back as
+       plain text; add_comment takes the Atlassian Document Format)
+    4. get_transitions, then do_transition to move an issue along
+
+    SEARCH RULES:
+    - Pass maxResults=100 (Jira's maximum; it returns 50 when omitted) to
+      search_issues and get_comments, and only the fields you need
+    - When the user needs every matching issue, use search_all_issues
+    - For several projects, issues or operations, make all the calls in
+      parallel rather than one after another
+
+    Explain Jira concepts to users who may be unfamiliar with them.
+    """
+
+# The toolset and agent are built on first access of jira_toolset or
+# root_agent (PEP 562), so importing this module alongside other agents costs
+# nothing until the Jira agent is actually used.
+
+@functools.cache
+def build_agent() -> Agent:
+    """Build the Jira assistant agent."""
+    return Agent(
+        name="jira_assistant",
+        model="gemini-2.5-flash",
+
+        description=JIRA_AGENT_DESCRIPTION,
+
+        instruction=JIRA_INSTRUCTION,
+
+        # Pass the toolset and the composite tools to the agent
+        tools=[load_jira_toolset(), search_all_issues, get_jql_cheatsheet],
+
+        # Turn ADF comment bodies and descriptions into plain text
+        after_tool_callback=shape_tool_result
+    )
+
+
+def __getattr__(name: str):
+    if name == "root_agent":
+        return build_agent()
+    if name == "jira_toolset":
+        return load_jira_toolset()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,44 +2,475 @@
 Example usage of the Jira Issue Retrieval Assistant
 """
 
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
 import os
+import re
+import shelve
+import sys
+import time
+from typing import Optional
+import httpx
 from dotenv import load_dotenv
-from agent import root_agent
-
-# Load environment variables from .env file
-load_dotenv()
-
-def main():
-    """Run example interactions with the Jira assistant"""
-    
-    # Check if credentials are set
-    if os.getenv("JIRA_EMAIL") == "your_jira_email@example.com":
-        print("Please update your .env file with actual Jira credentials before running this example.")
-        return
-    
-    # Example 1: List projects
-    print("\n=== Example 1: List Projects ===")
-    response = root_agent.run("List all projects in my Jira instance")
-    print(response)
-    
-    # Example 2: Search for issues
-    print("\n=== Example 2: Search for Issues ===")
-    project_key = input("Enter a project key from the list above: ")
-    response = root_agent.run(f"Find all open issues in the {project_key} project")
-    print(response)
-    
-    # Example 3: Get issue details
-    print("\n=== Example 3: Get Issue Details ===")
-    issue_key = input("Enter an issue key (e.g., PROJECT-123): ")
-    response = root_agent.run(f"Show me details for issue {issue_key}")
-    print(response)
-    
-    # Example 4: Add a comment
-    print("\n=== Example 4: Add a Comment ===")
-    issue_key = input("Enter an issue key to comment on: ")
-    comment = input("Enter your comment: ")
-    response = root_agent.run(f"Add a comment to issue {issue_key} saying: {comment}")
-    print(response)
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+import agent
+
+USER_ID = "example_user"
+
+# Issue keys mentioned in a reply, e.g. PROJECT-123, and project keys
+ISSUE_KEY = re.compile(r"\b[A-Z][A-Z0-9_]+-\d+\b")
+PROJECT_KEY = re.compile(r"\b[A-Z][A-Z0-9_]{1,9}\b")
+
+# Example 2 shows the open issues this many at a time, so the first page
+# comes back quickly however many issues the project has
+SEARCH_PAGE_SIZE = 25
+
+# How many of Example 2's issues have their details fetched ahead of time
+PREFETCH_ISSUES = 3
+
+# Replies to the read-only examples are kept on disk for a while, so running
+# the example again (demos, tutorials) reuses them instead of going back to
+# the model and Jira. They live next to the agent's tool cache, which is only
+# used when no other user can write to it. Projects rarely change; open issues do.
+REPLY_CACHE_NAME = "jira-example-replies"
+PROJECTS_TTL = 300
+SEARCH_TTL = 30
+
+
+# The prefetches and overlapped searches start agent runs alongside the one
+# the user is waiting for. At most JIRA_MAX_CONCURRENT_REQUESTS of them run at
+# once, so together they stay under Jira's rate limits. Unused prefetches are
+# cancelled before the next example runs, which frees their slots.
+@functools.cache
+def _run_slots() -> asyncio.Semaphore:
+    _creds()  # The limit may be set in the .env file
+    return asyncio.Semaphore(int(os.getenv("JIRA_MAX_CONCURRENT_REQUESTS", "3")))
+
+
+# Examples 2 and 3 ask fixed questions apart from the keys, so with direct
+# they skip the model: the JQL is filled in from this template and the tools
+# are called straight away. The search fetches what Example 3 shows, so an
+# issue it found is described without another Jira call.
+JQL_OPEN = "project = {project_key} AND statusCategory != Done"
+DIRECT_FIELDS = "summary,status,assignee,description"
+
+
+async def search_open_issues(project_key: str, next_page_token: Optional[str] = None) -> dict:
+    """One page of a project's open issues, straight from search_issues."""
+    # json.dumps quotes the key the way JQL expects
+    jql = JQL_OPEN.format(project_key=json.dumps(project_key))
+    args = {"jql": jql, "fields": DIRECT_FIELDS, "max_results": SEARCH_PAGE_SIZE}
+    if next_page_token is not None:
+        args["next_page_token"] = next_page_token
+    async with _run_slots():
+        return await agent.run_jira_tool("search_issues", args, None)
+
+
+async def get_issue_details(issue_key: str) -> dict:
+    """An issue's Example 3 fields, straight from get_issue."""
+    async with _run_slots():
+        return await agent.run_jira_tool(
+            "get_issue", {"issue_id_or_key": issue_key, "fields": DIRECT_FIELDS}, None
+        )
+
+
+def format_issue(issue: dict, details: bool = False) -> str:
+    """One line per issue, plus its assignee and description with details."""
+    fields = issue.get("fields") or {}
+    status = (fields.get("status") or {}).get("name", "")
+    text = f"{issue.get('key')}  [{status}]  {fields.get('summary', '')}"
+    if details:
+        assignee = (fields.get("assignee") or {}).get("displayName", "Unassigned")
+        text += f"\n  Assignee: {assignee}\n  {fields.get('description') or 'No description'}"
+    return text
+
+
+# Replies are streamed, so the examples print text as the model produces it
+# instead of once the whole reply is in
+STREAMING = RunConfig(streaming_mode=StreamingMode.SSE)
+
+
+async def run(runner: InMemoryRunner, session_id: str, prompt: str, echo: bool = False) -> str:
+    """
+    Send one prompt to the agent and return its final reply.
+
+    With echo, the reply is also printed as it streams in.
+    """
+    message = types.Content(role="user", parts=[types.Part(text=prompt)])
+    reply = ""
+    streamed = False
+    async with _run_slots():
+        async for event in runner.run_async(
+            user_id=USER_ID, session_id=session_id, new_message=message, run_config=STREAMING
+        ):
+            if not (event.content and event.content.parts):
+                continue
+            text = "".join(part.text or "" for part in event.content.parts if not part.thought)
+            if event.partial:
+                if echo and text:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                    streamed = True
+                continue
+            if event.is_final_response():
+                reply = text
+                if echo and not streamed:
+                    sys.stdout.write(text)
+            # The complete event repeats the text its partial events streamed
+            streamed = False
+    if echo:
+        print()
+    return reply
+
+
+async def new_session(runner: InMemoryRunner) -> str:
+    """A fresh session, for runs that shouldn't join the example's conversation."""
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=USER_ID
+    )
+    return session.id
+
+
+async def cached_run(
+    runner: InMemoryRunner, session_id: str, prompt: str, ttl: float, echo: bool = False
+) -> tuple[str, bool]:
+    """
+    run(), reusing this Jira account's reply to the same prompt from the last ttl seconds.
+
+    Returns the reply and whether it came from the cache, in which case the
+    session never saw the prompt or the tool results behind the reply.
+    """
+    creds = _creds()
+    key = hashlib.sha256(
+        f"{creds['domain']}\0{creds['email']}\0{prompt}".encode()
+    ).hexdigest()
+    cache_dir = agent.private_cache_dir()
+    if cache_dir is None:
+        return await run(runner, session_id, prompt, echo), False
+    cache_path = str(cache_dir / REPLY_CACHE_NAME)
+
+    try:
+        with shelve.open(cache_path) as cache:
+            expires, reply = cache[key]
+        if expires > time.time():
+            if echo:
+                print(reply)
+            return reply, True
+    except Exception:
+        pass  # Missing, expired or unreadable entry: ask the agent below
+
+    reply = await run(runner, session_id, prompt, echo)
+
+    try:
+        with shelve.open(cache_path) as cache:
+            cache[key] = (time.time() + ttl, reply)
+    except Exception:
+        pass  # Caching is best-effort
+
+    return reply, False
+
+
+@functools.cache
+def _creds() -> dict:
+    """Jira credentials from the .env file, read once per process."""
+    # Load environment variables from .env file
+    load_dotenv()
+    return {
+        "email": os.getenv("JIRA_EMAIL"),
+        "api_token": os.getenv("JIRA_API_TOKEN"),
+        "domain": os.getenv("JIRA_DOMAIN"),
+    }
+
+
+# The prompts name the fields they need, so the agent asks Jira for those
+# instead of every field of every issue. Example 2's search also fetches the
+# fields Example 3 shows, so when that search ran in the example's session,
+# an issue it found can be described from the tool results already there,
+# without another Jira call.
+#
+# search_issues pages by token, not by offset, so the model is asked to end
+# each page with the nextPageToken Jira returned, and the next page's prompt
+# passes it back.
+NEXT_PAGE_TOKEN = re.compile(
+    r"^[\W_]*nextPageToken[*:\s]*[`'\"]?([^\s`'\"*]+?)[`'\"*.]*\s*$", re.MULTILINE
+)
+
+
+def search_prompt(project_key: str, next_page_token: Optional[str] = None) -> str:
+    page = f"nextPageToken={next_page_token}" if next_page_token else "first page"
+    return (
+        f"Find open issues in the {project_key} project ({page}, "
+        f"maxResults={SEARCH_PAGE_SIZE}); fetch only key, summary, status, assignee, "
+        f"and description, and list only key, summary, and status. End with a line "
+        f"'nextPageToken: <token>' giving the nextPageToken Jira returned, or "
+        f"'nextPageToken: none' if isLast is true"
+    )
+
+
+def next_page_token(reply: str) -> Optional[str]:
+    """The token for the page after a search reply, or None after the last page."""
+    match = NEXT_PAGE_TOKEN.search(reply)
+    if match is None or match.group(1).lower() == "none":
+        return None
+    return match.group(1)
+
+
+def all_projects_search_prompt() -> str:
+    return (
+        "Find open issues in every project, grouped by project, 10 each; "
+        "return only key, summary, and status"
+    )
+
+
+def first_project_key(reply: str) -> Optional[str]:
+    """The first project key in Example 1's reply, if it mentions one."""
+    match = PROJECT_KEY.search(reply)
+    return match.group() if match else None
+
+
+@functools.cache
+def _ensure_creds() -> None:
+    """Stop, once, if the .env file doesn't have actual Jira credentials yet."""
+    email = _creds()["email"]
+    if not email or email == "your_jira_email@example.com":
+        raise SystemExit(
+            "Please update your .env file with actual Jira credentials before running this example."
+        )
+
+
+def issue_details_prompt(issue_key: str, from_search: bool = False) -> str:
+    prompt = f"Show me summary, status, assignee, and description for {issue_key}"
+    if from_search:
+        prompt += "; use the search results above if they have these fields rather than fetching it again"
+    return prompt
+
+
+async def prefetch_issue_details(runner: InMemoryRunner, reply: str) -> dict:
+    """
+    Start Example 3 for the first issues listed in a reply.
+
+    Each runs in its own session, so the tasks don't interleave turns in the
+    example's session. Returns the tasks by issue key.
+    """
+    tasks = {}
+    for issue_key in dict.fromkeys(ISSUE_KEY.findall(reply)):
+        if len(tasks) == PREFETCH_ISSUES:
+            break
+        tasks[issue_key] = asyncio.create_task(
+            run(runner, await new_session(runner), issue_details_prompt(issue_key))
+        )
+    return tasks
+
+
+def one_turn_prompt(project_key: str, issue_key: str, comment_key: str, comment: str) -> str:
+    """Examples 2-4 as a single request, so the agent can run their calls together."""
+    return (
+        "Do all of the following, making the Jira calls in parallel, and answer "
+        "with one section per task:\n"
+        f"1. {search_prompt(project_key)}\n"
+        f"2. {issue_details_prompt(issue_key)}\n"
+        f"3. Add a comment to issue {comment_key} saying: {comment}"
+    )
+
+
+async def _warm_up() -> None:
+    try:
+        await agent.warm_up_jira_connections()
+    except httpx.HTTPError:
+        pass  # Example 1's tool call connects, and reports any problem
+
+
+async def ask(value: Optional[str], prompt: str) -> str:
+    """A value given on the command line, or else the user's answer to prompt."""
+    if value:
+        return value
+    # In a thread, so prefetches keep running while the user types
+    return (await asyncio.to_thread(input, prompt)).strip()
+
+
+async def main(
+    one_turn: bool = False,
+    auto: bool = False,
+    direct: bool = False,
+    project_key: Optional[str] = None,
+    issue_key: Optional[str] = None,
+    comment: Optional[str] = None
+):
+    """
+    Run example interactions with the Jira assistant
+
+    With one_turn, the inputs for Examples 2-4 are asked for up front and the
+    three are sent as one prompt: one model round trip plans all their Jira
+    calls instead of one per example. With auto, Example 2 searches every
+    project at the same time as Example 1 runs, instead of waiting for a
+    project key. With direct, Examples 2 and 3 call the Jira tools without
+    going through the model.
+
+    The project key, issue key (used by Examples 3 and 4) and comment are
+    only asked for when they are not passed in. Example 2 then shows the
+    first page of issues without asking for more.
+    """
+
+    _ensure_creds()
+
+    # All four examples go through one runner in one event loop, so the Jira
+    # tools' shared connection pool keeps its connections between them and
+    # the TLS handshake with the Jira site is paid once. The agent reads the
+    # credentials when it is first used, after _creds() loaded the .env file.
+    runner = InMemoryRunner(agent=agent.root_agent, app_name="jira_assistant_example")
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=USER_ID
+    )
+
+    # Example 1's first model call takes a while before the agent calls Jira,
+    # so the connection to the Jira site is opened in the meantime: the
+    # project list then doesn't wait for the TLS handshake
+    warm_up = asyncio.create_task(_warm_up())
+
+    try:
+        # Example 2 doesn't depend on Example 1 in auto mode, so it starts
+        # first and runs alongside it, in its own session
+        auto_search = None
+        if auto and not one_turn and not direct:
+            auto_search = asyncio.create_task(cached_run(
+                runner, await new_session(runner), all_projects_search_prompt(), SEARCH_TTL
+            ))
+
+        # Example 1: List projects
+        print("\n=== Example 1: List Projects ===")
+        response, _ = await cached_run(
+            runner, session.id, "List all projects in my Jira instance", PROJECTS_TTL, echo=True
+        )
+
+        if one_turn:
+            print("\n=== Examples 2-4: Search, Details and Comment in One Request ===")
+            project_key = await ask(project_key, "Enter a project key from the list above: ")
+            comment_key = issue_key
+            issue_key = await ask(issue_key, "Enter an issue key (e.g., PROJECT-123): ")
+            comment_key = await ask(comment_key, "Enter an issue key to comment on: ")
+            comment = await ask(comment, "Enter your comment: ")
+            await run(
+                runner, session.id, one_turn_prompt(project_key, issue_key, comment_key, comment), echo=True
+            )
+            return
+
+        # Example 2: Search for issues
+        print("\n=== Example 2: Search for Issues ===")
+        # Issues found by the direct search, by key, and the keys of issues
+        # whose search ran in the example's session (not in a speculative
+        # session, nor replayed from the reply cache)
+        seen_issues = {}
+        searched_in_session = set()
+        if direct:
+            interactive = not project_key
+            project_key = await ask(project_key, "Enter a project key from the list above: ")
+            page = {}
+            while True:
+                page = await search_open_issues(project_key, page.get("nextPageToken"))
+                if not isinstance(page.get("issues"), list):
+                    print(page)  # Error from the search request
+                    break
+                for issue in page["issues"]:
+                    seen_issues[issue.get("key")] = issue
+                    print(format_issue(issue))
+                if page.get("isLast", False) or not page.get("nextPageToken"):
+                    break
+                if not interactive or input("more? [y/N] ").strip().lower() != "y":
+                    break
+        elif auto_search is not None:
+            response, _ = await auto_search
+            print(response)
+        else:
+            # While the user picks a project, the first page of the first
+            # project listed is fetched in case they pick that one
+            interactive = not project_key
+            guess = first_project_key(response) if interactive else None
+            speculative = None
+            if guess is not None:
+                speculative = asyncio.create_task(cached_run(
+                    runner, await new_session(runner), search_prompt(guess), SEARCH_TTL
+                ))
+            project_key = await ask(project_key, "Enter a project key from the list above: ")
+            if speculative is not None and project_key != guess:
+                speculative.cancel()
+                speculative = None
+
+            pages = []
+            token = None
+            while True:
+                if speculative is not None and not pages:
+                    response, _ = await speculative
+                    print(response)
+                else:
+                    response, from_cache = await cached_run(
+                        runner, session.id, search_prompt(project_key, token), SEARCH_TTL,
+                        echo=True
+                    )
+                    if not from_cache:
+                        searched_in_session.update(ISSUE_KEY.findall(response))
+                pages.append(response)
+                token = next_page_token(response)
+                if token is None:
+                    break  # Last page, or the reply gave no token to go on
+                if not interactive or input("more? [y/N] ").strip().lower() != "y":
+                    break
+            response = "\n".join(pages)
+
+        # Example 3: Get issue details
+        # The details of the first few issues found are fetched while the user
+        # is reading and typing
+        prefetched = {} if issue_key or direct else await prefetch_issue_details(runner, response)
+        print("\n=== Example 3: Get Issue Details ===")
+        comment_key = issue_key
+        issue_key = await ask(issue_key, "Enter an issue key (e.g., PROJECT-123): ")
+        prefetch = prefetched.pop(issue_key, None)
+        for task in prefetched.values():
+            task.cancel()
+        if direct:
+            issue = seen_issues.get(issue_key) or await get_issue_details(issue_key)
+            print(format_issue(issue, details=True) if "fields" in issue else issue)
+        elif prefetch is not None:
+            print(await prefetch)
+        else:
+            await run(
+                runner, session.id, issue_details_prompt(issue_key, issue_key in searched_in_session), echo=True
+            )
+
+        # Example 4: Add a comment
+        print("\n=== Example 4: Add a Comment ===")
+        comment_key = await ask(comment_key, "Enter an issue key to comment on: ")
+        comment = await ask(comment, "Enter your comment: ")
+        await run(runner, session.id, f"Add a comment to issue {comment_key} saying: {comment}", echo=True)
+    finally:
+        warm_up.cancel()
+        await runner.close()
+        await agent.close_jira_connections()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run example interactions with the Jira assistant")
+    parser.add_argument(
+        "--auto", action="store_true",
+        help="search every project alongside Example 1 instead of asking for a project key"
+    )
+    parser.add_argument("--one-turn", action="store_true", help="send Examples 2-4 as one request")
+    parser.add_argument(
+        "--direct", action="store_true",
+        help="run Examples 2 and 3 as direct Jira calls rather than through the model"
+    )
+    parser.add_argument("--project", help="project key for Example 2")
+    parser.add_argument("--issue", help="issue key for Examples 3 and 4")
+    parser.add_argument("--comment", help="comment for Example 4")
+    args = parser.parse_args()
+    asyncio.run(main(
+        one_turn=args.one_turn,
+        auto=args.auto,
+        direct=args.direct,
+        project_key=args.project,
+        issue_key=args.issue,
+        comment=args.comment
+    ))